@@ -39,49 +39,69 @@ def setTrustedBtcRelay(trustedRelayContract):
 # callers should probably explicitly check for a return value of 1 for success,
 # to protect against the possibility of send() returning non-zero error codes
 def processTransaction(txStr:str, txHash):
-    # apart from trustedBtcRelay, only the owner may claim ether
-    if msg.sender != self.trustedBtcRelay:
-        if tx.origin != self.owner:  # tx.origin is superset of msg.sender, so no need for checking msg.sender==self.owner
-            log(msg.sender, data=[-10])
+    err = m_claimError(txHash)
+    if err != 0:
+        log(msg.sender, data=[err])
+        return(0)
+
+    # txStr may also be the tx in binary, whose outputs are then read in
+    # memory instead of by getFirst2Outputs(): this is much cheaper for txs
+    # with many inputs
+    if isBinaryTx(txStr):
+        outputData = m_getOutputsBinary(txStr, [0, 1], 2)
+        if outputData == 0:
+            log(msg.sender, data=[-30])
             return(0)
 
-    # only the owner may reclaim; trustedBtcRelay and others can NOT reclaim
-    if self.txClaim[txHash] != 0:
-        if tx.origin != self.owner:  # allow owner to keep reclaiming (helpful in testing)
-            log(msg.sender, data=[-20])
+        numSatoshi = outputData[0]
+        # the address is after OP_DUP OP_HASH160 <push 20 bytes>
+        addrBtcWasSentTo = getBEBytes(txStr, 20, outputData[1] + 3)
+        ethAddr = getBEBytes(txStr, 20, outputData[4] + 3)
+    else:
+        outputData = self.getFirst2Outputs(txStr, outitems=3)
+
+        if outputData == 0:
+            log(msg.sender, data=[-30])
             return(0)
 
-    outputData = self.getFirst2Outputs(txStr, outitems=3)
+        numSatoshi = outputData[0]
+        indexScriptOne = outputData[1]
 
-    if outputData == 0:
-        log(msg.sender, data=[-30])
-        return(0)
+        #TODO strictly compare the script because an attacker may have a script that mentions
+        #our BTC address, but the BTC is not spendable by our private key (only spendable by attacker's key)
+        # btcWasSentToMe = compareScriptWithAddr(indexScriptOne, txStr, self.btcAcceptAddr)
+        addrBtcWasSentTo = getEthAddr(indexScriptOne, txStr, 20, 6)
 
-    numSatoshi = outputData[0]
-    indexScriptOne = outputData[1]
+        indexScriptTwo = outputData[2]
+        ethAddr = getEthAddr(indexScriptTwo, txStr, 20, 6)
+        # log(ethAddr)  # exp 848063048424552597789830156546485564325215747452L
 
-    #TODO strictly compare the script because an attacker may have a script that mentions
-    #our BTC address, but the BTC is not spendable by our private key (only spendable by attacker's key)
-    # btcWasSentToMe = compareScriptWithAddr(indexScriptOne, txStr, self.btcAcceptAddr)
-    addrBtcWasSentTo = getEthAddr(indexScriptOne, txStr, 20, 6)
+    # expEthAddr = text("948c765a6914d43f2a7ac177da2c2f6b52de3d7c")
 
-    btcWasSentToMe = addrBtcWasSentTo == self.btcAcceptAddr
+    return(m_claim(txHash, numSatoshi, addrBtcWasSentTo, ethAddr))
 
 
-    indexScriptTwo = outputData[2]
-    ethAddr = getEthAddr(indexScriptTwo, txStr, 20, 6)
-    # log(ethAddr)  # exp 848063048424552597789830156546485564325215747452L
+# like processTransaction(), but given the tx's first 2 outputs already
+# parsed by the relayer [see relayTxOutputs() in btcTxRelay.py], so
+# the tx is not read here.  Each output in 'outputs' is [satoshis, script,
+# scriptSize], where script is the script itself if it is up to 32 bytes,
+# otherwise its sha256
+def processOutputs(txHash, outNums:arr, outputs:arr):
+    err = m_claimError(txHash)
+    if err != 0:
+        log(msg.sender, data=[err])
+        return(0)
 
-    # expEthAddr = text("948c765a6914d43f2a7ac177da2c2f6b52de3d7c")
+    if len(outNums) != 2 || outNums[0] != 0 || outNums[1] != 1:
+        log(msg.sender, data=[-30])
+        return(0)
 
-    if (btcWasSentToMe && numSatoshi >= BTC_NEED):
-        res = send(ethAddr, ETH_TO_SEND)
-        self.txClaim[txHash] = res
-        log(msg.sender, data=[res])
-        return(res)
+    # the address is after OP_DUP OP_HASH160 <push 20 bytes>, ie bytes 3-22
+    # of the script
+    addrBtcWasSentTo = mod(div(outputs[1], 256^9), 2^160)
+    ethAddr = mod(div(outputs[4], 256^9), 2^160)
 
-    log(msg.sender, data=[-100])
-    return(0)
+    return(m_claim(txHash, outputs[0], addrBtcWasSentTo, ethAddr))
 
 
 def setOwner(newOwner):
@@ -91,6 +111,34 @@ def setOwner(newOwner):
     return(0)
 
 
+# the error code why the sender may not claim ether with 'txHash', or 0
+macro m_claimError($txHash):
+    with $err = 0:
+        # apart from trustedBtcRelay, only the owner may claim ether
+        # (tx.origin is superset of msg.sender, so no need for checking msg.sender==self.owner)
+        if msg.sender != self.trustedBtcRelay && tx.origin != self.owner:
+            $err = -10
+
+        # only the owner may reclaim; trustedBtcRelay and others can NOT reclaim
+        # (allowing the owner to keep reclaiming is helpful in testing)
+        elif self.txClaim[$txHash] != 0 && tx.origin != self.owner:
+            $err = -20
+        $err
+
+
+# sends ether to '$ethAddr' if the tx paid enough to this contract's btcAddr,
+# returning the value of send(), or 0 and logging -100 if it did not
+macro m_claim($txHash, $numSatoshi, $addrBtcWasSentTo, $ethAddr):
+    with $res = 0:
+        if $addrBtcWasSentTo == self.btcAcceptAddr && $numSatoshi >= BTC_NEED:
+            $res = send($ethAddr, ETH_TO_SEND)
+            self.txClaim[$txHash] = $res
+            log(msg.sender, data=[$res])
+        else:
+            log(msg.sender, data=[-100])
+        $res
+
+
 macro getEthAddr($indexStart, $inStr, $size, $offset):
     $endIndex = ($indexStart*2) + $offset + ($size * 2)
 
@@ -116,6 +164,12 @@ macro getEthAddr($indexStart, $inStr, $size, $offset):
     $result
 
 
+# a tx in hex starts with the character '0' of its version, while in binary
+# it starts with the version's low byte, and versions are small
+macro isBinaryTx($txStr):
+    getch($txStr, 0) != 48
+
+
 macro getBEBytes($inStr, $size, $offset):
     div(mload($inStr + $offset), 256**(32 - $size))
 
@@ -3,19 +3,91 @@ inset('btcrelay.py')
 # store 'count' number of Bitcoin blockheaders represented as one
 # continuous 'headersBinary' (which should have length 80*count
 # since a single Bitcoin block header is 80 bytes)
+#
+# The headers are read in place, instead of each being sliced off and given to
+# storeBlockHeader(), and stored with the same m_storeHeader.  A header's
+# parent is normally the header before it, so its hash and score are kept from
+# there and only the first header's parent score is read from storage.  The
+# Head and highScore are written once, at the end, for the block with the
+# highest score.
+# A header that is already stored is skipped.  A header whose parent is not
+# stored, or whose hash is not below its target, fails the whole batch, so
+# that a relayer sees the transaction fail.  This is done with ~invalid()
+# instead of assert, since a failed assert only stops execution and would keep
+# the headers stored before it (without updating the Head); ~invalid() undoes
+# the whole transaction and uses all of its gas.
+#
+# 'headersBinary' can also be compressed: the first header in full, then
+# each of the others without its hashPrevBlock, since that is the hash of the
+# header before it (see compressHeaders() in script/btcHeader.py).  That is
+# 80 + 48*(count-1) bytes, and each header is rebuilt in memory before it is
+# hashed.
+#
+# returns the height of the last header, or 0 if it was already stored
 def bulkStoreHeader(headersBinary:str, count):
     HEADER_SIZE = 80
+    COMPRESSED_HEADER_SIZE = 48
 
-    offset = 0
-    endIndex = HEADER_SIZE
+    compressed = (count > 1 && len(headersBinary) == HEADER_SIZE + (count - 1)*COMPRESSED_HEADER_SIZE)
+    if !compressed && len(headersBinary) != count*HEADER_SIZE:
+        return(0)
+
+    # compressed headers are rebuilt here.  The words written to it end up to
+    # 20 bytes after it
+    rebuilt = ~alloc(HEADER_SIZE + 32)
+
+    bestBlock = 0
+    bestScore = 0
+    res = 0
 
     i = 0
     while i < count:
-        currHeader = slice(headersBinary, chars=offset, chars=endIndex)
-        res = self.storeBlockHeader(currHeader)
+        if compressed && i > 0:
+            header = rebuilt
+            m_rebuildHeader(header, headersBinary + HEADER_SIZE + (i - 1)*COMPRESSED_HEADER_SIZE, rawHash)
+        else:
+            header = headersBinary + i*HEADER_SIZE
+
+        # hashPrevBlock is compared in header byte order, so that it is only
+        # flipped when it is not the header before
+        if i == 0 || ~mload(header + 4) != rawHash:
+            prevHash = flip32Bytes(~mload(header + 4))
+            prevScore = m_getScore(prevHash)
+        if !prevScore:  # prev block not stored
+            ~invalid()
+
+        rawHash = sha256(sha256(header, chars=HEADER_SIZE))
+        blockHash = flip32Bytes(rawHash)
+        score = m_getScore(blockHash)
+        res = 0
+
+        if score == 0:  # not already stored
+            res = m_storeHeader(header, blockHash, prevHash, prevScore, score)
+            if !res:  # the hash is not below the target
+                ~invalid()
 
-        offset += HEADER_SIZE
-        endIndex += HEADER_SIZE
+            # equality allows the later of blocks with the same score to
+            # become the Head, as in storeBlockHeader()
+            if score >= bestScore:
+                bestBlock = blockHash
+                bestScore = score
+
+        prevHash = blockHash
+        prevScore = score
         i += 1
 
+    if bestScore != 0 && bestScore >= self.highScore:
+        self.setHeaviest(bestBlock)
+        self.highScore = bestScore
+
     return(res)
+
+
+# write at '$header' the 80 byte header whose hashPrevBlock is '$rawPrevHash'
+# (the hash in header byte order) and whose other fields are the 48 bytes at
+# '$compressedHeader'
+macro m_rebuildHeader($header, $compressedHeader, $rawPrevHash):
+    ~mstore($header, ~mload($compressedHeader))  # version, and the bytes after it are overwritten below
+    ~mstore($header + 4, $rawPrevHash)
+    ~mstore($header + 36, ~mload($compressedHeader + 4))  # hashMerkleRoot
+    ~mstore($header + 68, ~mload($compressedHeader + 36))  # time, bits and nonce
@@ -4,7 +4,12 @@ inset('constants.se')
 # clarity: it has ancestor management and its
 # main method is inMainChain() which is tested by test_btcChain
 
+# a block has an ancestor at each of NUM_ANCESTOR_DEPTHS levels, where the
+# ancestor at level i is the latest block whose height is 1 mod
+# ANCESTOR_DEPTH_BASE**i (see m_getAncDepth).  The indexes of all of them
+# must fit in one 32 byte word, so NUM_ANCESTOR_DEPTHS can be at most 8
 macro NUM_ANCESTOR_DEPTHS: 8
+macro ANCESTOR_DEPTH_BASE: 5
 
 # list for internal usage only that allows a 32 byte blockHash to be looked up
 # with a 32bit int
@@ -15,35 +20,20 @@ data internalBlock[2^50]
 # counter for next available slot in internalBlock
 data ibIndex
 
+# optional index of the main chain: the hash of the main chain block at each
+# height up to that of the Head, so that inMainChain() is one lookup instead
+# of a walk down the ancestors.  Keeping it costs a write for each new Head
+# and, on a reorg, one for each block that changed [see m_setMainChain].
+# It is only kept if mainChainIndexed was set by enableMainChainIndex()
+data mainChain[2^64]
 
-# save the ancestors for a block, as well as updating the height
-def saveAncestors(blockHash, hashPrevBlock):
-    self.internalBlock[self.ibIndex] = blockHash
-    m_setIbIndex(blockHash, self.ibIndex)
-    self.ibIndex += 1
-
-    m_setHeight(blockHash, m_getHeight(hashPrevBlock) + 1)
-
-    # 8 indexes into internalBlock can be stored inside one ancestor (32 byte) word
-    ancWord = 0
-
-    # the first ancestor is the index to hashPrevBlock, and write it to ancWord
-    prevIbIndex = m_getIbIndex(hashPrevBlock)
-    m_mwrite32(ref(ancWord), prevIbIndex)
+data mainChainIndexed
 
-    # update ancWord with the remaining indexes
-    i = 1
-    while i < NUM_ANCESTOR_DEPTHS:
-        depth = m_getAncDepth(i)
 
-        if m_getHeight(blockHash) % depth == 1:
-            m_mwrite32(ref(ancWord) + 4*i, prevIbIndex)
-        else:
-            m_mwrite32(ref(ancWord) + 4*i, m_getAncestor(hashPrevBlock, i))
-        i += 1
-
-    # write the ancestor word to storage
-    self.block[blockHash]._ancestor = ancWord
+# save the ancestors for a block, as well as its height and internalBlock
+# index, with a score of 0 [see m_saveAncestors]
+def saveAncestors(blockHash, hashPrevBlock):
+    m_saveAncestors(blockHash, hashPrevBlock, 0)
 
 
 # returns 1 if 'txBlockHash' is in the main chain, ie not a fork
@@ -58,6 +48,9 @@ def inMainChain(txBlockHash):
     if !txBlockHeight:
         return(0)
 
+    if self.mainChainIndexed:
+        return(txBlockHeight <= m_getHeight(self.heaviestBlock) && self.mainChain[txBlockHeight] == txBlockHash)
+
     blockHash = self.heaviestBlock
 
     anc_index = NUM_ANCESTOR_DEPTHS - 1
@@ -73,6 +66,47 @@ def inMainChain(txBlockHash):
 # macros
 #
 
+# save the ancestors for '$blockHash', and its _info with '$score' [see
+# m_setInfo].  returns the block's height
+#
+# hashPrevBlock is the ancestor at level 0, and also at each level whose depth
+# divides (height - 1).  Since each depth is a multiple of the one below it,
+# these are the levels up to the first one that doesn't, and the block's
+# ancestors at all the levels above are the same as hashPrevBlock's
+macro m_saveAncestors($blockHash, $hashPrevBlock, $score):
+    $ibIndex = self.ibIndex
+    self.internalBlock[$ibIndex] = $blockHash
+    self.ibIndex = $ibIndex + 1
+
+    # the parent's height and internalBlock index are both in its _info
+    $prevInfo = sload(ref(self.block[$hashPrevBlock]._info))
+    $height = div($prevInfo, BYTES_24) + 1
+    $prevIbIndex = mod(div($prevInfo, BYTES_16), BYTES_8)
+    m_setInfo($blockHash, $height, $ibIndex, $score)
+
+    $numPrevLevels = 1
+    $depth = ANCESTOR_DEPTH_BASE
+    while $numPrevLevels < NUM_ANCESTOR_DEPTHS && $height % $depth == 1:
+        $numPrevLevels += 1
+        $depth *= ANCESTOR_DEPTH_BASE
+
+    # 8 indexes into internalBlock can be stored inside one ancestor (32 byte)
+    # word, with level 0 in the first 4 bytes
+    $ancWord = 0
+    $i = 0
+    while $i < $numPrevLevels:
+        $ancWord = $ancWord * BYTES_4 + $prevIbIndex
+        $i += 1
+
+    # the remaining levels are copied from the parent's ancestor word
+    $copied = 2^(32*(8 - $numPrevLevels))
+    $ancWord = $ancWord * $copied + mod(sload(ref(self.block[$hashPrevBlock]._ancestor)), $copied)
+
+    # write the ancestor word to storage
+    self.block[$blockHash]._ancestor = $ancWord
+    $height
+
+
 # a block's _ancestor storage slot contains 8 indexes into internalBlock, so
 # this macro returns the index that can be used to lookup the desired ancestor
 # eg. for combined usage, self.internalBlock[m_getAncestor(someBlock, 2)] will
@@ -81,9 +115,10 @@ macro m_getAncestor($blockHash, $whichAncestor):
     div(sload(ref(self.block[$blockHash]._ancestor)) * 2**(32*$whichAncestor), BYTES_28)
 
 
-# index should be 0 to 7, so this returns 1, 5, 25 ... 78125
+# index should be 0 to NUM_ANCESTOR_DEPTHS-1, so with the default base of 5
+# this returns 1, 5, 25 ... 78125
 macro m_getAncDepth($index):
-    5**$index
+    ANCESTOR_DEPTH_BASE**$index
 
 
 # write $int32 to memory at $addrLoc
@@ -1,6 +1,13 @@
 # This file is an optimized version of btcTx.py for retrieving
 # the first 2 outputs of a Bitcoin transaction.
 # It is tested via test_btc-eth.py
+#
+# getOutputsBinary() reads a tx given in binary instead, in memory and
+# without any calls (see m_getOutputsBinary in txReader.se)
+
+inset('constants.se')
+inset('byteOrder.se')
+inset('txReader.se')
 
 # read the VarInt and advance the cursor
 macro parseVarInt($txStr, $cursor):
@@ -69,6 +76,16 @@ def getFirst2Outputs(txStr:str):
 
 
 
+# outputs 'outNums' (ascending) of the binary tx 'txBytes', as an array of
+# [satoshis, scriptIndex, scriptSize] for each.  returns an empty array if
+# the tx does not have all of them
+def getOutputsBinary(txBytes:str, outNums:arr):
+    outputs = m_getOutputsBinary(txBytes, outNums, len(outNums))
+    if outputs == 0:
+        return([]:arr)
+    return(outputs:arr)
+
+
 macro getVarintNum($txStr, $pos):
     $ret = getUInt8($txStr, $pos)
     if $ret == 0xfd:
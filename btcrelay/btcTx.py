@@ -2,6 +2,10 @@
 
 # TODO items= syntax may need to be replaced per updated Serpent
 
+inset('constants.se')
+inset('byteOrder.se')
+inset('txReader.se')
+
 # contains the string to be deserialized/parse (currently a tx or blockheader)
 data gStr[]
 
@@ -128,6 +132,64 @@ def doCheckOutputScript(rawTx:str, size, outNum, expHashOfOutputScript):
     return(hash == expHashOfOutputScript)
 
 
+# binary equivalents of parseTransaction() and doCheckOutputScript(): 'txBytes'
+# is the raw tx in binary (not hex).  the tx is read in memory in one pass, so
+# the cost is linear in the size of the tx, and nothing is written to storage
+
+# returns [satoshis, outputScriptSize, outputScriptIndex] for output 'outNum',
+# where outputScriptIndex is the offset of the script in 'txBytes'.
+# returns [0, 0, 0] if the tx has no such output
+def parseTransactionBinary(txBytes:str, outNum):
+    outputIndex = m_findOutput(txBytes, outNum)
+    if outputIndex == 0:
+        return([0, 0, 0]:arr)
+
+    cursor = outputIndex + 8  # skip satoshis
+    scriptSize = m_readVarInt(txBytes, cursor)
+    if cursor + scriptSize > len(txBytes):
+        return([0, 0, 0]:arr)
+
+    return([m_readUIntLE(txBytes + outputIndex, 8), scriptSize, cursor]:arr)
+
+
+# unlike doCheckOutputScript(), expHashOfOutputScript is the sha256 of the
+# binary output script (not of its hex)
+def doCheckOutputScriptBinary(txBytes:str, outNum, expHashOfOutputScript):
+    output = self.parseTransactionBinary(txBytes, outNum, outitems=3)
+    if output[2] == 0:  # no such output
+        return(0)
+
+    hash = sha256(txBytes + output[2], chars=output[1])
+    return(hash == expHashOfOutputScript)
+
+
+# all the outputs of 'txBytes' (or only the first 'maxOutputs' if it is not 0)
+# read in one pass, as an array of [satoshis, scriptIndex, scriptSize] for
+# each, like getOutputsBinary() of btcSpecialTx.py.  this is cheaper than
+# calling parseTransactionBinary() for each output, which skips the inputs
+# every time.
+# returns an empty array if the tx is truncated
+def parseOutputsBinary(txBytes:str, maxOutputs):
+    cursor = 0
+    numOuts = m_skipToOutputs(txBytes, cursor)
+    count = numOuts
+    if maxOutputs != 0 and maxOutputs < count:
+        count = maxOutputs
+    if count > len(txBytes) / 9:  # an output is at least 9 bytes
+        return([]:arr)
+
+    outNums = array(count)
+    i = 0
+    while i < count:
+        outNums[i] = i
+        i += 1
+
+    outputs = m_readOutputs(txBytes, cursor, numOuts, outNums, count)
+    if outputs == 0:
+        return([]:arr)
+    return(outputs:arr)
+
+
 # only handles lowercase a-f
 # tested via tests for readUInt8, readUInt32LE, ...
 def readUnsignedBitsLE(bits):
@@ -0,0 +1,155 @@
+inset('constants.se')
+inset('byteOrder.se')
+inset('txReader.se')
+inset('merkle.se')
+
+# relays binary txs, or their parsed outputs, to destination contracts, and
+# verifies batches of merkle proofs, with a deployed btcrelay instead of
+# including it, so that btcrelay (and btcBulkStoreHeaders) stay small enough
+# to create within a block's gas
+#
+# the relay must have verifyTx(), and a destination contract must have a
+# function named 'processTransaction' with signature si:i [see btcrelay.py],
+# or 'processOutputs' with signature iaa:i for relayTxOutputs()
+extern btcrelay: [verifyTx:iiai:i]
+extern relayDestination: [processTransaction:si:i]
+extern outputsDestination: [processOutputs:iaa:i]
+
+data owner
+
+# the btcrelay that verifies the txs
+data trustedBtcRelay
+
+
+def init():
+    self.owner = msg.sender
+
+# trustedRelayContract is the address of the btcrelay that verifies the txs
+def setTrustedBtcRelay(trustedRelayContract):
+    if tx.origin == self.owner:
+        self.trustedBtcRelay = trustedRelayContract
+        return(1)
+    return(0)
+
+
+# relays the binary transaction 'txBytes' like relayTx() of btcrelay.py,
+# computing its hash instead of it being passed in.  The target 'contract'
+# is given the binary tx, so its processTransaction() must be able to read
+# one [see btc-eth.py], and should trust this contract instead of the relay.
+# returns and logs the value of processTransaction().
+#
+# if the transaction does not meet verification, error code -9999
+# is logged on both this contract and target contract
+def relayTxBinary(txBytes:str, txIndex, sibling:arr, txBlockHash, contract):
+    txHash = m_hashTx(txBytes)
+    relay = self.trustedBtcRelay
+    if relay.verifyTx(txHash, txIndex, sibling, txBlockHash) == 1:
+        res = contract.processTransaction(txBytes, txHash)
+        log(msg.sender, data=[res])
+        return(res)
+
+    # log error code -9999 on both this contract and target contract
+    log(msg.sender, data=[-9999])
+    log(contract, data=[-9999])
+    return(0)
+
+
+# verifies several merkle proofs at once: proof i is 'txHashes[i]',
+# 'txIndexes[i]', the next 'siblingCounts[i]' entries of 'sibling' (ie the
+# siblings of all the proofs are concatenated), and 'txBlockHashes[i]'.
+# Only the first proof that verifies for each distinct block is given to the
+# relay's verifyTx(): the merkle root that it gives is kept, and the other
+# proofs of the block are checked against it here.
+#
+# returns a bitmap where bit i is 1 if proof i verifies, so at most
+# 256 proofs can be given; 0 is returned for more, or if the arrays
+# have different lengths
+def verifyTxBatch(txHashes:arr, txIndexes:arr, sibling:arr, siblingCounts:arr, txBlockHashes:arr):
+    numProofs = len(txHashes)
+    if numProofs > 256 || len(txIndexes) != numProofs || len(siblingCounts) != numProofs || len(txBlockHashes) != numProofs:
+        return(0)
+
+    # the blocks verified so far, and their merkle root
+    checkedBlock = array(numProofs)
+    checkedRoot = array(numProofs)
+    numChecked = 0
+
+    relay = self.trustedBtcRelay
+    result = 0
+    siblingStart = 0
+    i = 0
+    while i < numProofs:
+        # a count outside 0..len(sibling) could make siblingStart wrap around
+        # and reuse siblings, so this and the remaining proofs fail
+        if siblingCounts[i] < 0 || siblingCounts[i] > len(sibling):
+            return(result)
+
+        if siblingStart + siblingCounts[i] <= len(sibling):
+            txBlockHash = txBlockHashes[i]
+            proof = slice(sibling, items=siblingStart, items=siblingStart + siblingCounts[i])
+            merkle = m_computeMerkle(txHashes[i], txIndexes[i], proof)
+
+            j = 0
+            while j < numChecked && checkedBlock[j] != txBlockHash:
+                j += 1
+            if j < numChecked:
+                if merkle == checkedRoot[j]:
+                    result += 2^i
+            elif relay.verifyTx(txHashes[i], txIndexes[i], proof, txBlockHash) == 1:
+                checkedBlock[j] = txBlockHash
+                checkedRoot[j] = merkle
+                numChecked += 1
+                result += 2^i
+
+        siblingStart += siblingCounts[i]
+        i += 1
+
+    return(result)
+
+
+# relays the outputs 'outNums' (ascending) of the binary transaction 'txBytes'
+# to target 'contract' processOutputs(txHash, outNums, outputs), so that it
+# does not have to parse the tx itself [see btc-eth.py].  The tx is verified
+# as in relayTxBinary() and then read once.  'outputs' has [satoshis, script,
+# scriptSize] for each output, in the order of getOutputsBinary() [see
+# btcSpecialTx.py], but with the script itself instead of its index in the tx
+# [see m_scriptWord].
+# returns and logs the value of processOutputs().
+#
+# if the transaction does not meet verification or does not have all of
+# 'outNums', error code -9999 is logged on both this contract and target
+# contract
+def relayTxOutputs(txBytes:str, txIndex, sibling:arr, txBlockHash, outNums:arr, contract):
+    txHash = m_hashTx(txBytes)
+    relay = self.trustedBtcRelay
+    if relay.verifyTx(txHash, txIndex, sibling, txBlockHash) == 1:
+        count = len(outNums)
+        outputs = m_getOutputsBinary(txBytes, outNums, count)
+        if outputs != 0:
+            i = 0
+            while i < count:
+                outputs[3*i + 1] = m_scriptWord(txBytes + outputs[3*i + 1], outputs[3*i + 2])
+                i += 1
+
+            res = contract.processOutputs(txHash, outNums, outputs)
+            log(msg.sender, data=[res])
+            return(res)
+
+    # log error code -9999 on both this contract and target contract
+    log(msg.sender, data=[-9999])
+    log(contract, data=[-9999])
+    return(0)
+
+
+# the '$scriptSize' byte script at memory address '$script' as one word: the
+# script itself, as a big-endian number with the bytes after it zeroed, if it
+# fits, eg pay-to-pubkey-hash (25 bytes), and otherwise its sha256
+macro m_scriptWord($script, $scriptSize):
+    with $size = $scriptSize:
+        with $word = 0:
+            if $size > 32:
+                $word = sha256($script, chars=$size)
+            else:
+                with $pad = 256^(32 - $size):
+                    $word = div(~mload($script), $pad) * $pad
+            $word
@@ -1,4 +1,6 @@
 inset('btcChain.py')
+inset('byteOrder.se')
+inset('merkle.se')
 
 # btcrelay can relay a transaction to any contract that has a function
 # name 'processTransaction' with signature si:i
@@ -8,13 +10,17 @@ extern relayDestination: [processTransaction:si:i]
 # note: _ancestor[9]
 #
 # a Bitcoin block (header) is stored as:
-# - _blockHeader 80 bytes
 # - _info who's 32 bytes are comprised of "_height" 8bytes, "_ibIndex" 8bytes, "_score" 16bytes
 # -   "_height" is 1 more than the typical Bitcoin term height/blocknumber [see setPreGensesis()]
 # -   "_ibIndex" is the block's index to internalBlock (see btcChain)
 # -   "_score" is 1 more than the cumulative difficulty [see setInitialParent()]
 # - _ancestor stores 8 32bit ancestor indices for more efficient backtracking (see btcChain)
-data block[2**256](_info, _ancestor, _blockHeader[])
+# - _prevBlock and _merkleRoot are the header's hashPrevBlock and
+#   hashMerkleRoot, each in its own word and in the same byte order as block
+#   hashes, so that each is read with one sload.  These are the only fields
+#   of the header that are read later, so the rest of it is not stored
+#   [see getBlockHeader()]
+data block[2**256](_info, _ancestor, _prevBlock, _merkleRoot)
 
 
 # block with the highest score (aka the Head of the blockchain)
@@ -23,6 +29,21 @@ data heaviestBlock
 # highest score among all blocks (so far)
 data highScore
 
+# the main chain blocks at the NUM_RECENT_BLOCKS heights up to that of
+# heaviestBlock, the block at height h being at index h % NUM_RECENT_BLOCKS.
+# It is kept current by m_setHeaviest, so that within6Confirms() and
+# getAverageBlockDifficulty() look blocks up instead of walking back from
+# the Head
+data recentBlock[16]  # NUM_RECENT_BLOCKS
+
+# needs to be at least CONFIRMATIONS, and more than the 10 blocks of
+# getAverageBlockDifficulty()
+macro NUM_RECENT_BLOCKS: 16
+
+# how many blocks, including its own, must be in the main chain from a
+# block to the Head before its txs can be verified
+macro CONFIRMATIONS: 6
+
 
 # def init():
     # TODO anything else to init ?
@@ -30,9 +51,30 @@ data highScore
     # issues such as https://github.com/ethereum/serpent/issues/77 78 ...
 
 
+# keep an index of the main chain for inMainChain() [see mainChain in btcChain].
+# This can only be called before setInitialParent(), and costs more gas for
+# each stored header in exchange for a constant cost of verifyTx() however
+# deep the tx's block is
+def enableMainChainIndex():
+    if self.highScore != 0:
+        return(0)
+    self.mainChainIndexed = 1
+    return(1)
+
+
 #TODO for testing only; should be omitted for production
 def testingonlySetHeaviest(blockHash):
-    self.heaviestBlock = blockHash
+    self.setHeaviest(blockHash)
+
+
+# make 'blockHash' the Head [see m_setHeaviest].  Only this contract can call
+# it: the Head is set here for storeBlockHeader() and, once for all its
+# headers, for bulkStoreHeader() [see btcBulkStoreHeaders.py]
+def setHeaviest(blockHash):
+    if msg.sender != self:
+        return(0)
+    m_setHeaviest(blockHash)
+    return(1)
 
 
 # this can only be called once and allows testing of storing
@@ -53,17 +95,19 @@ def setInitialParent(blockHash, height, cumulativeDifficulty):
     else:
         self.highScore = 1  # matches the score that is set below in this function
 
-    self.heaviestBlock = blockHash
-
     # _height cannot be set to -1 because inMainChain() assumes that
     # a block with height0 does NOT exist (thus we cannot allow the
     # real genesis block to be at height0)
-    # self.block[blockHash]._height = height
-    m_setHeight(blockHash, height)
-
+    #
     # do NOT pass cumulativeDifficulty of 0, since score0 means
     # block does NOT exist. see check in storeBlockHeader()
-    m_setScore(blockHash, cumulativeDifficulty)
+    m_setInfo(blockHash, height, 0, cumulativeDifficulty)
+
+    # the block is the only one in the main chain [see m_setHeaviest]
+    self.heaviestBlock = blockHash
+    self.recentBlock[height % NUM_RECENT_BLOCKS] = blockHash
+    if self.mainChainIndexed:
+        self.mainChain[height] = blockHash
 
     # _ancestor can remain zeros because
     # self.internalBlock[0] already points to blockHash
@@ -74,38 +118,25 @@ def setInitialParent(blockHash, height, cumulativeDifficulty):
 # store a Bitcoin block header that must be provided in
 # binary format 'blockHeaderBinary'
 def storeBlockHeader(blockHeaderBinary:str):
-    hashPrevBlock = flip32Bytes(~calldataload(72))  # 68 (header start) + 4 (offset for hashPrevBlock)
-
-    # TODO store in var
-    assert m_getScore(hashPrevBlock)  # assert prev block exists
+    hashPrevBlock = flip32Bytes(~mload(blockHeaderBinary + 4))  # 4 (offset for hashPrevBlock)
+    prevScore = m_getScore(hashPrevBlock)
+    assert prevScore  # assert prev block exists
 
     blockHash = m_hashBlockHeader(blockHeaderBinary)
 
     if m_getScore(blockHash) != 0:  # block already stored/exists
         return(0)
 
-    bits = m_bitsFromBlockHeader()
-    target = targetFromBits(bits)
-
-    # we only check the target and do not do other validation (eg timestamp)
-    # to save gas
-    if blockHash > 0 && blockHash < target:
-        self.saveAncestors(blockHash, hashPrevBlock)
-
-        save(self.block[blockHash]._blockHeader[0], blockHeaderBinary, chars=80) # or 160?
-
-        difficulty = 0x00000000FFFF0000000000000000000000000000000000000000000000000000 / target # https://en.bitcoin.it/wiki/Difficulty
-        m_setScore(blockHash, m_getScore(hashPrevBlock) + difficulty)
+    score = 0
+    height = m_storeHeader(blockHeaderBinary, blockHash, hashPrevBlock, prevScore, score)
 
-        # equality allows block with same score to become the Head, so that
-        # when a Head is orphaned, the chain can still continue
-        if m_getScore(blockHash) >= self.highScore:
-            self.heaviestBlock = blockHash
-            self.highScore = m_getScore(blockHash)
+    # equality allows block with same score to become the Head, so that
+    # when a Head is orphaned, the chain can still continue
+    if height != 0 && score >= self.highScore:
+        self.setHeaviest(blockHash)
+        self.highScore = score
 
-        return(m_getHeight(blockHash))
-
-    return(0)
+    return(height)
 
 
 # returns 1 if tx is in the block given by 'txBlockHash' and the block is
@@ -134,8 +165,8 @@ def verifyTx(txHash, txIndex, sibling:arr, txBlockHash):
 # if the transaction does not meet verification, error code -9999
 # is logged on both this contract and target contract
 #
-# TODO txHash can eventually be computed (dbl sha256 then flip32Bytes) when
-# txStr becomes txBinary
+# txStr may be in hex or binary; for a binary tx, relayTxBinary() of
+# btcTxRelay.py computes txHash
 def relayTx(txStr:str, txHash, txIndex, sibling:arr, txBlockHash, contract):
     if self.verifyTx(txHash, txIndex, sibling, txBlockHash) == 1:
         res = contract.processTransaction(txStr, txHash)
@@ -148,6 +179,16 @@ def relayTx(txStr:str, txHash, txIndex, sibling:arr, txBlockHash, contract):
     return(0)
 
 
+# return 'blockHeaderBinary' if it is the header of a stored block, otherwise
+# return an empty string.  Only the fields of a header that the relay needs
+# are stored, so callers that need the whole header (eg its timestamp) supply
+# it, and this checks it against the relay
+def getBlockHeader(blockHeaderBinary:str):
+    if len(blockHeaderBinary) == 80 && m_getScore(m_hashBlockHeader(blockHeaderBinary)) != 0:
+        return(blockHeaderBinary:str)
+    return(string(0):str)
+
+
 # return the hash of the heaviest block aka the Head
 def getBlockchainHead():
     # log(self.heaviestBlock)
@@ -176,10 +217,11 @@ def getAverageBlockDifficulty():
 
     cumulDifficultyHead = m_getScore(blockHash)
 
-    i = 0
-    while i < 10:
-        blockHash = getPrevBlock(blockHash)
-        i += 1
+    height = m_getHeight(blockHash)
+    if height >= 10:
+        blockHash = self.recentBlock[(height - 10) % NUM_RECENT_BLOCKS]
+    else:
+        blockHash = 0
 
     cumulDifficulty10Ancestors = m_getScore(blockHash)
 
@@ -190,47 +232,19 @@ def getAverageBlockDifficulty():
 # [see documentation for verifyTx() for the merkle proof
 # format of 'txHash', 'txIndex', 'sibling' ]
 def computeMerkle(txHash, txIndex, sibling:arr):
-    resultHash = txHash
-    proofLen = len(sibling)
-    i = 0
-    while i < proofLen:
-        proofHex = sibling[i]
-
-        sideOfSibling = txIndex % 2  # 0 means sibling is on the right; 1 means left
-
-        if sideOfSibling == 1:
-            left = proofHex
-            right = resultHash
-        elif sideOfSibling == 0:
-            left = resultHash
-            right = proofHex
-
-        resultHash = concatHash(left, right)
-
-        txIndex /= 2
-        i += 1
-
-    if !resultHash:
-        return(-1)
-
-    return(resultHash)
+    return(m_computeMerkle(txHash, txIndex, sibling))
 
 
-# returns 1 if the 'txBlockHash' is within 6 blocks of self.heaviestBlock
-# otherwise returns 0.
+# returns 1 if the 'txBlockHash' is within CONFIRMATIONS (6) blocks of
+# self.heaviestBlock otherwise returns 0.
 # note: return value of 0 does not mean 'txBlockHash' has more than 6
 # confirmations; a non-existent 'txBlockHash' will lead to a return value of 0
 def within6Confirms(txBlockHash):
-    blockHash = self.heaviestBlock
-
-    i = 0
-    while i < 6:
-        if txBlockHash == blockHash:
-            return(1)
+    txBlockHeight = m_getHeight(txBlockHash)
+    headHeight = m_getHeight(self.heaviestBlock)
 
-        # blockHash = self.block[blockHash]._prevBlock
-        blockHash = getPrevBlock(blockHash)
-        i += 1
+    if txBlockHeight <= headHeight && headHeight - txBlockHeight < CONFIRMATIONS:
+        return(self.recentBlock[txBlockHeight % NUM_RECENT_BLOCKS] == txBlockHash)
 
     return(0)
 
@@ -239,18 +253,52 @@ def within6Confirms(txBlockHash):
 # macros
 #
 
+# make '$blockHash' the Head and update recentBlock for it.  Entries are
+# rewritten walking back from the new Head until one is already that of the
+# main chain: this is only the Head's own entry when it extends the previous
+# Head.  If the new Head is lower than the previous one, all entries are
+# rewritten since those of the previous chain above it could remain
+macro m_setHeaviest($blockHash):
+    $prevHeadHeight = m_getHeight(self.heaviestBlock)
+    self.heaviestBlock = $blockHash
+    if self.mainChainIndexed:
+        m_setMainChain($blockHash, $prevHeadHeight)
+
+    $height = m_getHeight($blockHash)
+    $mainChainBlock = $blockHash
+    $i = 0
+    while $i < NUM_RECENT_BLOCKS && $i <= $height:
+        $index = ($height - $i) % NUM_RECENT_BLOCKS
+        if $height >= $prevHeadHeight && self.recentBlock[$index] == $mainChainBlock:
+            $i = NUM_RECENT_BLOCKS  # the rest are already in the main chain
+        else:
+            self.recentBlock[$index] = $mainChainBlock
+            $mainChainBlock = getPrevBlock($mainChainBlock)
+            $i += 1
+
+
+# update mainChain for the new Head '$blockHash', walking back from it until
+# an entry is already that of the main chain.  Entries above the previous
+# Head's height '$prevHeadHeight' are always rewritten: they can be left
+# from a chain that was the main chain before a reorg to a lower Head
+macro m_setMainChain($blockHash, $prevHeadHeight):
+    $height = m_getHeight($blockHash)
+    $mainChainBlock = $blockHash
+    # the parent of the block given to setInitialParent() is 0
+    while $mainChainBlock != 0 && ($height > $prevHeadHeight || self.mainChain[$height] != $mainChainBlock):
+        self.mainChain[$height] = $mainChainBlock
+        $mainChainBlock = getPrevBlock($mainChainBlock)
+        $height -= 1
+
+
 # get the parent of '$blockHash'
 macro getPrevBlock($blockHash):
-    with $addr = ref(self.block[$blockHash]._blockHeader[0]):
-        $tmp = sload($addr) * BYTES_4 + div(sload($addr+1), BYTES_28)  # must use div()
-    flip32Bytes($tmp)
+    self.block[$blockHash]._prevBlock
 
 
 # get the merkle root of '$blockHash'
 macro getMerkleRoot($blockHash):
-    with $addr = ref(self.block[$blockHash]._blockHeader[0]):
-        $tmp = sload($addr+1) * BYTES_4 + div(sload($addr+2), BYTES_28)  # must use div()
-    flip32Bytes($tmp)
+    self.block[$blockHash]._merkleRoot
 
 
 # Bitcoin-way of hashing a block header
@@ -258,9 +306,29 @@ macro m_hashBlockHeader($blockHeaderBytes):
     flip32Bytes(sha256(sha256($blockHeaderBytes:str)))
 
 
-# get the 'bits' field from a Bitcoin blockheader
-macro m_bitsFromBlockHeader():
-    with $w = ~calldataload(68+72):  # 68 (header start) + 72 (offset for 'bits')
+# store the 80 byte header at memory address '$header', whose hash is
+# '$blockHash', as a child of '$hashPrevBlock', whose score is '$prevScore'.
+# We only check the target and do not do other validation (eg timestamp)
+# to save gas.  Returns the block's height, or 0 if its hash is not below its
+# target; its score is left in '$score'.
+# storeBlockHeader() and bulkStoreHeader() [see btcBulkStoreHeaders.py] store
+# headers with this, and then set the Head themselves
+macro m_storeHeader($header, $blockHash, $hashPrevBlock, $prevScore, $score):
+    with $target = targetFromBits(m_bitsFromHeaderAt($header)):
+        with $height = 0:
+            if $blockHash > 0 && $blockHash < $target:
+                # https://en.bitcoin.it/wiki/Difficulty
+                $score = mod($prevScore + 0x00000000FFFF0000000000000000000000000000000000000000000000000000 / $target, BYTES_16)
+                $height = m_saveAncestors($blockHash, $hashPrevBlock, $score)
+
+                self.block[$blockHash]._prevBlock = $hashPrevBlock
+                self.block[$blockHash]._merkleRoot = flip32Bytes(~mload($header + 36))  # 36 (offset for hashMerkleRoot)
+            $height
+
+
+# get the 'bits' field of the Bitcoin blockheader at memory address '$header'
+macro m_bitsFromHeaderAt($header):
+    with $w = ~mload($header + 72):  # 72 (offset for 'bits')
         byte(0, $w) + byte(1, $w)*BYTES_1 + byte(2, $w)*BYTES_2 + byte(3, $w)*BYTES_3
 
 
@@ -272,120 +340,21 @@ macro targetFromBits($bits):
     $mant * 256^($exp - 3)
 
 
-# Bitcoin-way merkle parent of transaction hashes $tx1 and $tx2
-macro concatHash($tx1, $tx2):
-    with $x = ~alloc(64):
-        ~mstore($x, flip32Bytes($tx1))
-        ~mstore($x + 32, flip32Bytes($tx2))
-        flip32Bytes(sha256(sha256($x, chars=64)))
-
-
-# reverse 32 bytes given by '$b32'
-macro flip32Bytes($b32):
-    with $a = $b32:  # important to force $a to only be examined once below
-        mstore8(ref($o), byte(31, $a))
-        mstore8(ref($o) + 1,  byte(30, $a))
-        mstore8(ref($o) + 2,  byte(29, $a))
-        mstore8(ref($o) + 3,  byte(28, $a))
-        mstore8(ref($o) + 4,  byte(27, $a))
-        mstore8(ref($o) + 5,  byte(26, $a))
-        mstore8(ref($o) + 6,  byte(25, $a))
-        mstore8(ref($o) + 7,  byte(24, $a))
-        mstore8(ref($o) + 8,  byte(23, $a))
-        mstore8(ref($o) + 9,  byte(22, $a))
-        mstore8(ref($o) + 10, byte(21, $a))
-        mstore8(ref($o) + 11, byte(20, $a))
-        mstore8(ref($o) + 12, byte(19, $a))
-        mstore8(ref($o) + 13, byte(18, $a))
-        mstore8(ref($o) + 14, byte(17, $a))
-        mstore8(ref($o) + 15, byte(16, $a))
-        mstore8(ref($o) + 16, byte(15, $a))
-        mstore8(ref($o) + 17, byte(14, $a))
-        mstore8(ref($o) + 18, byte(13, $a))
-        mstore8(ref($o) + 19, byte(12, $a))
-        mstore8(ref($o) + 20, byte(11, $a))
-        mstore8(ref($o) + 21, byte(10, $a))
-        mstore8(ref($o) + 22, byte(9, $a))
-        mstore8(ref($o) + 23, byte(8, $a))
-        mstore8(ref($o) + 24, byte(7, $a))
-        mstore8(ref($o) + 25, byte(6, $a))
-        mstore8(ref($o) + 26, byte(5, $a))
-        mstore8(ref($o) + 27, byte(4, $a))
-        mstore8(ref($o) + 28, byte(3, $a))
-        mstore8(ref($o) + 29, byte(2, $a))
-        mstore8(ref($o) + 30, byte(1, $a))
-        mstore8(ref($o) + 31, byte(0, $a))
-    $o
-
-
-# write $int64 to memory at $addrLoc
-# This is useful for writing 64bit ints inside one 32 byte word
-macro m_mwrite64($addrLoc, $int64):
-    with $addr = $addrLoc:
-        with $eightBytes = $int64:
-            mstore8($addr, byte(24, $eightBytes))
-            mstore8($addr + 1, byte(25, $eightBytes))
-            mstore8($addr + 2, byte(26, $eightBytes))
-            mstore8($addr + 3, byte(27, $eightBytes))
-            mstore8($addr + 4, byte(28, $eightBytes))
-            mstore8($addr + 5, byte(29, $eightBytes))
-            mstore8($addr + 6, byte(30, $eightBytes))
-            mstore8($addr + 7, byte(31, $eightBytes))
-
-
-# write $int128 to memory at $addrLoc
-# This is useful for writing 128bit ints inside one 32 byte word
-macro m_mwrite128($addrLoc, $int128):
-    with $addr = $addrLoc:
-        with $bytes16 = $int128:
-            mstore8($addr, byte(16, $bytes16))
-            mstore8($addr + 1, byte(17, $bytes16))
-            mstore8($addr + 2, byte(18, $bytes16))
-            mstore8($addr + 3, byte(19, $bytes16))
-            mstore8($addr + 4, byte(20, $bytes16))
-            mstore8($addr + 5, byte(21, $bytes16))
-            mstore8($addr + 6, byte(22, $bytes16))
-            mstore8($addr + 7, byte(23, $bytes16))
-            mstore8($addr + 8, byte(24, $bytes16))
-            mstore8($addr + 9, byte(25, $bytes16))
-            mstore8($addr + 10, byte(26, $bytes16))
-            mstore8($addr + 11, byte(27, $bytes16))
-            mstore8($addr + 12, byte(28, $bytes16))
-            mstore8($addr + 13, byte(29, $bytes16))
-            mstore8($addr + 14, byte(30, $bytes16))
-            mstore8($addr + 15, byte(31, $bytes16))
-
-
-
 #
 #  macro accessors for a block's _info (height, ibIndex, score)
 #
 
-# block height is the first 8 bytes of _info
-macro m_setHeight($blockHash, $blockHeight):
-    $word = sload(ref(self.block[$blockHash]._info))
-    m_mwrite64(ref($word), $blockHeight)
-    self.block[$blockHash]._info = $word
+# _info is the block's height (first 8 bytes), its index to
+# self.internalBlock (second 8 bytes) and its score (last 16 bytes).
+# It is written whole, with one sstore, when the block is stored
+macro m_setInfo($blockHash, $height, $ibIndex, $score):
+    self.block[$blockHash]._info = $height*BYTES_24 + mod($ibIndex, BYTES_8)*BYTES_16 + mod($score, BYTES_16)
 
 macro m_getHeight($blockHash):
     div(sload(ref(self.block[$blockHash]._info)), BYTES_24)
 
-
-# index to self.internalBlock is the second 8 bytes of _info
-macro m_setIbIndex($blockHash, $internalIndex):
-    $word = sload(ref(self.block[$blockHash]._info))
-    m_mwrite64(ref($word) + 8, $internalIndex)
-    self.block[$blockHash]._info = $word
-
 macro m_getIbIndex($blockHash):
     div(sload(ref(self.block[$blockHash]._info)) * BYTES_8, BYTES_24)
 
-
-# score of the block is the last 16 bytes of _info
-macro m_setScore($blockHash, $blockScore):
-    $word = sload(ref(self.block[$blockHash]._info))
-    m_mwrite128(ref($word) + 16, $blockScore)
-    self.block[$blockHash]._info = $word
-
 macro m_getScore($blockHash):
     div(sload(ref(self.block[$blockHash]._info)) * BYTES_16, BYTES_16)
@@ -15,3 +15,13 @@ def testConcatHash():
     tx2 = 0xfff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4
     r = concatHash(tx1, tx2)
     return(r == 0xccdafb73d8dcd0173d5d5c3c9a0770d0b3953db889dab99ef05b1907518cb815)
+
+
+def testFlip32Bytes():
+    r = flip32Bytes(0x000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f)
+    return(r == 0x1f1e1d1c1b1a191817161514131211100f0e0d0c0b0a09080706050403020100)
+
+
+# index into internalBlock of the ancestor of 'blockHash' at 'level'
+def getAncestor(blockHash, level):
+    return(m_getAncestor(blockHash, level))
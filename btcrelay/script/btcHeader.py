@@ -0,0 +1,81 @@
+# helpers for binary (80 byte) Bitcoin block headers that compute the same
+# values as the macros in btcrelay.py
+
+import hashlib
+import struct
+
+
+HEADER_SIZE = 80
+
+# a header without its hashPrevBlock [see compressHeaders]
+COMPRESSED_HEADER_SIZE = 48
+
+# https://en.bitcoin.it/wiki/Difficulty (same constant as storeBlockHeader)
+DIFFICULTY_1_TARGET = 0x00000000FFFF0000000000000000000000000000000000000000000000000000
+
+
+def dblSha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+# block hash in the usual hex form, as returned by eg blockr
+def hashHeader(bhBinary):
+    return dblSha256(bhBinary)[::-1].encode('hex')
+
+
+# block hash as an int, as returned by the contract's getBlockchainHead()
+def hashHeaderInt(bhBinary):
+    return int(hashHeader(bhBinary), 16)
+
+
+def prevHashOf(bhBinary):
+    return bhBinary[4:36][::-1].encode('hex')
+
+
+def merkleRootOf(bhBinary):
+    return bhBinary[36:68][::-1].encode('hex')
+
+
+def bitsOf(bhBinary):
+    return struct.unpack('<I', bhBinary[72:76])[0]
+
+
+# same as the targetFromBits macro: mant * 256^(exp - 3) in 256bit arithmetic,
+# so an exponent below 3 gives a target of 0 (and the header is rejected)
+def targetFromBits(bits):
+    exp = bits >> 24
+    mant = bits & 0xffffff
+    if exp < 3:
+        return 0
+    return (mant * 256**(exp - 3)) % 2**256
+
+
+# difficulty that storeBlockHeader adds to the score of a block
+def difficultyFromBits(bits):
+    target = targetFromBits(bits)
+    if target == 0:
+        return 0  # EVM division by 0
+    return DIFFICULTY_1_TARGET / target
+
+
+# compressed form of the concatenated headers 'headersBinary', for
+# bulkStoreHeader: the first header in full, then each of the others without
+# its hashPrevBlock (bytes 4 to 36), since that is the hash of the header
+# before it.  raises ValueError if the headers are not a chain
+def compressHeaders(headersBinary):
+    parts = [headersBinary[:HEADER_SIZE]]
+    for offset in xrange(HEADER_SIZE, len(headersBinary), HEADER_SIZE):
+        bhBinary = headersBinary[offset:offset+HEADER_SIZE]
+        if bhBinary[4:36] != dblSha256(headersBinary[offset-HEADER_SIZE:offset]):
+            raise ValueError('header {0} does not link to the one before it'.format(offset / HEADER_SIZE))
+        parts.append(bhBinary[:4] + bhBinary[36:])
+    return ''.join(parts)
+
+
+# the concatenated headers of compressHeaders() output 'compressed'
+def decompressHeaders(compressed):
+    headers = [compressed[:HEADER_SIZE]]
+    for offset in xrange(HEADER_SIZE, len(compressed), COMPRESSED_HEADER_SIZE):
+        part = compressed[offset:offset+COMPRESSED_HEADER_SIZE]
+        headers.append(part[:4] + dblSha256(headers[-1]) + part[4:])
+    return ''.join(headers)
@@ -0,0 +1,81 @@
+# Picks how many headers to put in each bulkStoreHeader transaction.
+#
+# The gas needed per header is not constant (eg saveAncestors and whether
+# storage slots are fresh), so instead of hardcoding a chunk size and gas,
+# the cost per header is estimated from the receipts of recent bulkStoreHeader
+# transactions, or from a dry run of bulkStoreHeader against a local tester
+# state.  The chunk size is then the largest that fits the block gas limit.
+
+import os
+from collections import deque
+
+
+TX_BASE_GAS = 21000  # charged for every transaction, whatever the chunk size
+
+# the gas per header of the store120Calldata scenario of test/gasBenchmark.py
+# (120 headers from 300K, including their calldata), which is what record()
+# measures from a receipt.  Re-measure it when bulkStoreHeader changes
+DEFAULT_GAS_PER_HEADER = 116000
+
+BULK_STORE_CONTRACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'btcBulkStoreHeaders.py')
+
+
+class ChunkSizer(object):
+
+    # 'margin' is the factor applied to the estimated gas so that a chunk
+    # with slightly more expensive headers does not run out of gas
+    def __init__(self, gasPerHeader=DEFAULT_GAS_PER_HEADER, margin=1.2,
+            window=20, minChunk=1, maxChunk=500):
+        self.initialGasPerHeader = gasPerHeader
+        self.margin = margin
+        self.minChunk = minChunk
+        self.maxChunk = maxChunk
+        self.samples = deque(maxlen=window)
+
+
+    # record the gasUsed from the receipt of a bulkStoreHeader of 'count' headers
+    def record(self, gasUsed, count):
+        if count > 0:
+            self.samples.append(float(gasUsed - TX_BASE_GAS) / count)
+
+
+    # the most expensive header among recent samples is used, since a chunk
+    # is only useful if all of its headers get stored
+    def gasPerHeader(self):
+        if not self.samples:
+            return self.initialGasPerHeader
+        return max(self.samples)
+
+
+    # gas to send with a bulkStoreHeader of 'count' headers
+    def gasFor(self, count):
+        return int(TX_BASE_GAS + count * self.gasPerHeader() * self.margin)
+
+
+    # largest chunk whose gasFor() fits within 'gasLimit'
+    def chunkSize(self, gasLimit):
+        size = int((gasLimit - TX_BASE_GAS) / (self.gasPerHeader() * self.margin))
+        return max(self.minChunk, min(self.maxChunk, size))
+
+
+# returns the gas used by bulkStoreHeader for 'headersBinary' (which has
+# 'count' headers), by storing them in a fresh tester state whose initial
+# parent is 'parentHash' at height 'parentHeight'.
+# This needs pyethereum and Serpent, which the relayer itself does not.
+def estimateWithTester(headersBinary, count, parentHash, parentHeight,
+        contract=BULK_STORE_CONTRACT):
+    from ethereum import tester
+
+    gasLimit = tester.gas_limit
+    tester.gas_limit = 10**8
+    try:
+        s = tester.state()
+        c = s.abi_contract(contract)
+        c.setInitialParent(parentHash, parentHeight, 1)
+        res = c.bulkStoreHeader(headersBinary, count, profiling=True)
+    finally:
+        tester.gas_limit = gasLimit
+    if res['output'] != parentHeight + count:
+        raise Exception('dry run stored up to {0} instead of {1}'.format(
+            res['output'], parentHeight + count))
+    return res['gas']
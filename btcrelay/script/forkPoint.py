@@ -0,0 +1,47 @@
+# Finding where the relay contract's main chain forks from Bitcoin's.
+#
+# When the contract's Head is orphaned, the main chain blocks that the contract
+# has are the ones up to some height (the fork point), and none above it.  So
+# the fork point can be found with a binary search over heights, asking the
+# contract with inMainChain() (a call, no transaction) whether it has the main
+# chain block at a height in its own main chain.
+
+
+# height of the highest main chain block that the contract also has in its
+# main chain, searching from 'contractHeight' down to 'contractHeight' -
+# 'maxDepth'.  'realHashAt' returns the main chain hash at a height and
+# 'inContractMainChain' returns whether the contract has a hash in its
+# main chain.
+# returns None if the fork is deeper than 'maxDepth'
+def findForkPoint(contractHeight, realHashAt, inContractMainChain, maxDepth):
+    inContract = lambda height: inContractMainChain(realHashAt(height))
+
+    lo = contractHeight - maxDepth
+    if not inContract(lo):
+        # either the fork is deeper than maxDepth, or the contract has no
+        # blocks as low as 'lo' since its initial parent is above it.  For
+        # the latter, the search starts from the lowest block it has
+        lo = lowestInContract(lo + 1, contractHeight, inContract)
+        if lo is None:
+            return None
+
+    # the fork point is in [lo, hi]
+    hi = contractHeight
+    while lo < hi:
+        mid = (lo + hi + 1) / 2
+        if inContract(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+# the lowest height from 'startHeight' to 'endHeight' whose main chain block
+# the contract has, or None.  The contract has none below its initial parent
+# nor above the fork point, so this is only a walk up to the initial parent
+# when the fork is not deeper than it
+def lowestInContract(startHeight, endHeight, inContract):
+    for height in range(startHeight, endHeight + 1):
+        if inContract(height):
+            return height
+    return None
@@ -0,0 +1,174 @@
+# Packed binary corpus of Bitcoin block headers.
+#
+# The text corpus (test/headers/*.txt) has one header per line in hex, so
+# every consumer reads it line by line and decodes the hex.  A binary corpus
+# is instead:
+#
+#   <name>      16 byte file header (magic, startHeight, count), followed by
+#               'count' 80 byte headers in height order
+#   <name>.idx  'count' records of 32 byte block hash + 4 byte height,
+#               sorted by hash so that a height can be looked up by hash
+#
+# HeaderCorpus reads both through mmap, so getting the headers for any height
+# range is O(1) and returns a view of the file rather than a copy.
+#
+# To convert text files (which must be given in height order):
+#   python script/headerCorpus.py out.bhc test/headers/bh80_100k.txt ...
+
+import mmap
+import os
+import re
+import struct
+from argparse import ArgumentParser
+from bisect import bisect_left
+
+from btcHeader import HEADER_SIZE, dblSha256, prevHashOf, hashHeader
+
+
+MAGIC = 'BHC1'
+FILE_HEADER = struct.Struct('<4sII4x')
+INDEX_RECORD = struct.Struct('<32sI')
+
+
+class HeaderCorpus(object):
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.startHeight, self.count = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a header corpus'.format(path))
+        self.endHeight = self.startHeight + self.count - 1
+
+        self.idx = None
+        if os.path.exists(path + '.idx'):
+            with open(path + '.idx', 'rb') as f:
+                self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+    def close(self):
+        self.mm.close()
+        if self.idx is not None:
+            self.idx.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    # view of the headers from 'startHeight' to 'endHeight' inclusive, as one
+    # contiguous buffer ready for bulkStoreHeader (use str() for a copy)
+    def headers(self, startHeight, endHeight):
+        if startHeight < self.startHeight or endHeight > self.endHeight or startHeight > endHeight:
+            raise IndexError('heights {0}-{1} are not in {2}-{3}'.format(
+                startHeight, endHeight, self.startHeight, self.endHeight))
+        offset = FILE_HEADER.size + (startHeight - self.startHeight) * HEADER_SIZE
+        return buffer(self.mm, offset, (endHeight - startHeight + 1) * HEADER_SIZE)
+
+
+    def header(self, height):
+        return self.headers(height, height)
+
+
+    # height of the block with (hex) hash 'blockHash', or None
+    def heightOf(self, blockHash):
+        if self.idx is None:
+            raise IOError('{0}.idx does not exist'.format(self.path))
+        key = blockHash.decode('hex')
+        i = bisect_left(_IndexKeys(self.idx), key)
+        if i < self.count:
+            [indexHash, height] = INDEX_RECORD.unpack_from(self.idx, i * INDEX_RECORD.size)
+            if indexHash == key:
+                return height
+        return None
+
+
+# sequence of the hashes in an index, for bisect
+class _IndexKeys(object):
+
+    def __init__(self, idx):
+        self.idx = idx
+
+    def __len__(self):
+        return len(self.idx) / INDEX_RECORD.size
+
+    def __getitem__(self, i):
+        offset = i * INDEX_RECORD.size
+        return self.idx[offset:offset+32]
+
+
+# write the headers from the text files 'textPaths' (in height order, one hex
+# header per line) as a binary corpus at 'outPath', plus its index.
+# 'startHeight' is the height of the first header; if None it comes
+# from the name of the first file (see heightFromFilename).
+# raises ValueError if a header does not link to the previous one.
+# returns the number of headers written
+def convertText(textPaths, outPath, startHeight=None):
+    if startHeight is None:
+        startHeight = heightFromFilename(textPaths[0])
+
+    index = []
+    prevHash = None
+    with open(outPath, 'wb') as out:
+        out.write(FILE_HEADER.pack(MAGIC, startHeight, 0))
+        for textPath in textPaths:
+            with open(textPath) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    # lines may have more than the header, eg from getBlock.py
+                    bhBinary = line[:HEADER_SIZE*2].decode('hex')
+                    height = startHeight + len(index)
+                    if prevHash is not None and prevHashOf(bhBinary) != prevHash:
+                        raise ValueError('{0} at height {1} does not link to the previous header'.format(
+                            textPath, height))
+
+                    blockHash = dblSha256(bhBinary)[::-1]
+                    out.write(bhBinary)
+                    index.append((blockHash, height))
+                    prevHash = blockHash.encode('hex')
+
+        out.seek(0)
+        out.write(FILE_HEADER.pack(MAGIC, startHeight, len(index)))
+
+    index.sort()
+    with open(outPath + '.idx', 'wb') as out:
+        for blockHash, height in index:
+            out.write(INDEX_RECORD.pack(blockHash, height))
+
+    return len(index)
+
+
+# the height of the first header in one of the test/headers files, eg
+# bh170001.txt -> 170001, 500from300k.txt -> 300000, bh80_100k.txt -> 80001
+def heightFromFilename(path):
+    name = os.path.basename(path)
+    m = re.match(r'bh(\d+)_\d+k\.txt$', name)
+    if m:
+        return int(m.group(1)) * 1000 + 1
+    m = re.match(r'\d+from(\d+)k\.txt$', name)
+    if m:
+        return int(m.group(1)) * 1000
+    m = re.match(r'bh(\d+)\.txt$', name)
+    if m:
+        return int(m.group(1))
+    raise ValueError('start height of {0} is unknown, it needs to be given'.format(path))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('out', help='binary corpus to write (the index is written to <out>.idx)')
+    parser.add_argument('text', nargs='+', help='text header files, in height order')
+    parser.add_argument('--start', type=int, help='height of the first header (default: from the first filename)')
+    args = parser.parse_args()
+
+    count = convertText(args.text, args.out, startHeight=args.start)
+    corpus = HeaderCorpus(args.out)
+    print('@@@ wrote {0} headers {1}-{2}  last: {3}').format(count, corpus.startHeight,
+        corpus.endHeight, hashHeader(corpus.header(corpus.endHeight)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# Streaming load of a binary header corpus into the relay contract.
+#
+# The height to resume from is that of the contract's Head, which is looked up
+# in the corpus index (see headerCorpus.py) instead of hashing the headers of
+# a text file until one matches.  Chunks are views of the corpus taken as they
+# are needed, and are submitted by a PipelinedSubmitter so that several
+# bulkStoreHeader transactions are pending at once.
+#
+# If submission fails part way, eg the node goes away or a chunk keeps
+# failing, the Head is read again and loading resumes from it, so headers
+# that were stored before the failure are not sent again.
+
+from time import time
+
+
+# throughput of a load: the headers and gas of every confirmed chunk.
+# It has the same record() as a ChunkSizer, so it can be given to a
+# PipelinedSubmitter as its 'stats'
+class LoadStats(object):
+
+    def __init__(self, clock=time):
+        self.clock = clock
+        self.startTime = clock()
+        self.numHeaders = 0
+        self.gasUsed = 0
+
+
+    def record(self, gasUsed, count):
+        self.numHeaders += count
+        self.gasUsed += gasUsed
+
+
+    def elapsed(self):
+        return self.clock() - self.startTime
+
+
+    def headersPerSec(self):
+        elapsed = self.elapsed()
+        return self.numHeaders / elapsed if elapsed > 0 else 0.0
+
+
+    def gasPerSec(self):
+        elapsed = self.elapsed()
+        return self.gasUsed / elapsed if elapsed > 0 else 0.0
+
+
+    def __str__(self):
+        return '{0} headers {1} gas in {2:.1f}s: {3:.2f} headers/s {4:.0f} gas/s'.format(
+            self.numHeaders, self.gasUsed, self.elapsed(), self.headersPerSec(), self.gasPerSec())
+
+
+# generator of [bhBinary, count] chunks of the headers from 'startHeight' to
+# 'endHeight' inclusive of 'corpus'.  Each chunk is copied out of the corpus
+# only when it is taken, so memory use does not grow with the range
+def corpusChunks(corpus, startHeight, endHeight, chunkSize):
+    height = startHeight
+    while height <= endHeight:
+        last = min(height + chunkSize - 1, endHeight)
+        yield [str(corpus.headers(height, last)), last - height + 1]
+        height = last + 1
+
+
+# height of the block 'headHash' (an int, as from getBlockchainHead()) in
+# 'corpus'.  Raises ValueError if the corpus does not have it, since there is
+# then nothing in the corpus that the contract can store next
+def resumeHeight(corpus, headHash):
+    height = corpus.heightOf('{0:064x}'.format(headHash))
+    if height is None:
+        raise ValueError('contract head {0:064x} is not in {1}'.format(headHash, corpus.path))
+    return height
+
+
+# store the headers of 'corpus' after the contract's Head up to 'endHeight'
+# (default: the end of the corpus).  'getHead' returns the contract's Head.
+# If submitter.submit() raises, loading resumes from the Head up to
+# 'maxRestarts' times, after which the exception is raised.  A submit() that
+# returns without the Head having moved (eg its transactions were mined but
+# did not store the headers) counts as a restart too, so that the same chunks
+# are not sent forever.
+# returns the height of the last header stored
+def load(corpus, submitter, getHead, chunkSize, endHeight=None, maxRestarts=5,
+        stats=None, reportEvery=10):
+    if endHeight is None:
+        endHeight = corpus.endHeight
+
+    restarts = 0
+    # where the last submit() that returned started from
+    lastStart = None
+    while True:
+        startHeight = resumeHeight(corpus, getHead()) + 1
+        if startHeight > endHeight:
+            return startHeight - 1
+
+        if startHeight == lastStart:
+            restarts += 1
+            if restarts > maxRestarts:
+                raise Exception('no headers were stored from {0}'.format(startHeight))
+            print('@@@ no headers were stored  resuming from contract head ({0} of {1})').format(
+                restarts, maxRestarts)
+
+        print('@@@ loading {0}-{1} in chunks of {2}').format(startHeight, endHeight, chunkSize)
+        chunks = _reporting(corpusChunks(corpus, startHeight, endHeight, chunkSize), stats, reportEvery)
+        try:
+            submitter.submit(chunks)
+            lastStart = startHeight
+        except Exception as e:
+            lastStart = None
+            restarts += 1
+            if restarts > maxRestarts:
+                raise
+            print('@@@ load failed: {0}  resuming from contract head ({1} of {2})').format(
+                e, restarts, maxRestarts)
+
+
+# pass 'chunks' through, printing 'stats' after every 'reportEvery' of them
+def _reporting(chunks, stats, reportEvery):
+    for i, chunk in enumerate(chunks):
+        if stats is not None and i and i % reportEvery == 0:
+            print('@@@ {0}').format(stats)
+        yield chunk
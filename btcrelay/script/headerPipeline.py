@@ -0,0 +1,213 @@
+# Pipelined submission of Bitcoin block headers to the relay contract.
+#
+# fetchd.storeHeaders() sends one bulkStoreHeader transaction and then waits
+# for it to be mined before the next chunk is even fetched.  Here, headers are
+# prefetched by a pool of threads while earlier chunks are being submitted,
+# and up to 'maxInFlight' bulkStoreHeader transactions are kept pending at
+# once, each with an explicitly assigned nonce.
+#
+# Receipts are collected in whatever order they are mined.  A chunk is
+# considered failed if its transaction used all of its gas (which is what
+# bulkStoreHeader does when a header of the chunk is invalid or does not build
+# on a stored one, so that none of the chunk is stored).  Since every chunk
+# builds on the headers of the previous one, a failure means that chunk and all
+# later chunks are resubmitted.
+# A transaction that is not mined within 'receiptTimeout' seconds is replaced:
+# the chunk is sent again with the same nonce, so that only one of them can be
+# mined, and a gasPrice 'gasPriceBump' times higher, so that nodes accept the
+# replacement and miners prefer it.
+#
+# If a ChunkSizer is given, the gas sent with each chunk comes from it and
+# it is fed the gasUsed of every successful chunk.  'stats' (eg a LoadStats
+# from headerLoader.py) is fed the same.
+#
+# With 'compress', chunks are sent in the compressed format that
+# bulkStoreHeader accepts (see btcHeader.compressHeaders), which saves the
+# calldata of every hashPrevBlock after the first.
+
+from multiprocessing.pool import ThreadPool
+from time import sleep, time
+
+from pyepm import api
+
+from btcHeader import compressHeaders
+
+
+BULK_STORE_SIG = 'bulkStoreHeader:[bytes,int256]:int256'
+HEADER_SIZE = 80
+
+
+# generator of the binary headers from 'startHeight' to 'endHeight' inclusive,
+# in order.  'fetchHeader' is called with a height and must return the 80 byte
+# binary header; up to 'numThreads' calls are made concurrently so that
+# fetching runs ahead of whoever consumes the headers
+def prefetchHeaders(fetchHeader, startHeight, endHeight, numThreads=8):
+    pool = ThreadPool(numThreads)
+    try:
+        for bhBinary in pool.imap(fetchHeader, xrange(startHeight, endHeight+1)):
+            yield bhBinary
+    finally:
+        pool.terminate()
+
+
+# group binary headers into [bhBinary, count] chunks for bulkStoreHeader;
+# the last chunk has fewer than 'chunkSize' headers if they don't divide evenly.
+# 'chunkSize' may be a function, which is then called for the size of each chunk
+def makeChunks(headers, chunkSize):
+    sizeOf = chunkSize if callable(chunkSize) else lambda: chunkSize
+
+    strings = ''
+    count = 0
+    size = sizeOf()
+    for bhBinary in headers:
+        strings += bhBinary
+        count += 1
+        if count >= size:
+            yield [strings, count]
+            size = sizeOf()
+            strings = ''
+            count = 0
+
+    if count:
+        yield [strings, count]
+
+
+class PipelinedSubmitter(object):
+
+    def __init__(self, instance, relayContract, gas=900000, gasPrice=int(10e12),
+            maxInFlight=4, receiptTimeout=600, pollInterval=2, maxRetries=5,
+            sizer=None, stats=None, compress=False, gasPriceBump=1.125):
+        self.instance = instance
+        self.relayContract = relayContract if relayContract.startswith('0x') else '0x' + relayContract
+        self.gas = gas
+        self.gasPrice = gasPrice
+        self.maxInFlight = maxInFlight
+        self.receiptTimeout = receiptTimeout
+        self.pollInterval = pollInterval
+        self.maxRetries = maxRetries
+        self.sizer = sizer
+        self.stats = stats
+        self.compress = compress
+        self.gasPriceBump = gasPriceBump
+
+
+    # submit every [bhBinary, count] chunk from the 'chunks' iterable and
+    # return once all of them have been mined successfully.
+    # Raises an Exception if the same chunk fails, or is replaced, more than
+    # maxRetries times.
+    def submit(self, chunks):
+        chunks = iter(chunks)
+        sent = []  # chunks taken from the iterable so far, kept for resubmission
+
+        first = 0  # index of the first chunk that hasn't been confirmed
+        retries = 0
+        while True:
+            failed = self._submitFrom(first, chunks, sent)
+            if failed is None:
+                break
+
+            print('@@@ chunk {0} failed, resubmitting {1} chunks from it').format(
+                failed, len(sent) - failed)
+            retries = retries + 1 if failed == first else 1
+            if retries > self.maxRetries:
+                raise Exception('chunk {0} failed {1} times'.format(failed, retries))
+            first = failed
+
+        return len(sent)
+
+
+    # send chunks starting at index 'first', keeping up to maxInFlight pending.
+    # returns None when every chunk is confirmed, otherwise the index of
+    # the first chunk that failed
+    def _submitFrom(self, first, chunks, sent):
+        # after a failure this picks up the nonce of a dropped transaction, or
+        # the next unused nonce if all the failed transactions were mined
+        nonce = self.instance.transaction_count(defaultBlock='pending')
+
+        # nonce -> [chunk index, gas, gasPrice, time sent, txHashes], where
+        # txHashes has the chunk's transaction and any replacements of it
+        pending = {}
+        failed = None
+        nextIndex = first
+        exhausted = False
+
+        while True:
+            while failed is None and len(pending) < self.maxInFlight and not exhausted:
+                if nextIndex == len(sent):
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    sent.append(chunk)
+
+                [bhBinary, count] = sent[nextIndex]
+                gas = self.sizer.gasFor(count) if self.sizer else self.gas
+                txHash = self.sendChunk(bhBinary, count, nonce, gas)
+                print('@@@ sent chunk {0} ({1} headers) nonce: {2} tx: {3}').format(
+                    nextIndex, count, nonce, txHash)
+                pending[nonce] = [nextIndex, gas, self.gasPrice, time(), [txHash]]
+                nextIndex += 1
+                nonce += 1
+
+            if not pending:
+                return failed
+
+            sleep(self.pollInterval)
+
+            for txNonce, [index, gas, gasPrice, sentTime, txHashes] in pending.items():
+                # whichever of the transactions with this nonce was mined
+                receipt = None
+                for txHash in txHashes:
+                    receipt = receipt or self.getReceipt(txHash)
+
+                if receipt is None:
+                    if time() - sentTime >= self.receiptTimeout:
+                        self._replace(pending, txNonce, sent)
+                    continue
+
+                gasUsed = int(receipt['gasUsed'], 16)
+                ok = gasUsed < gas
+                if ok and self.sizer:
+                    self.sizer.record(gasUsed, sent[index][1])
+                if ok and self.stats:
+                    self.stats.record(gasUsed, sent[index][1])
+
+                del pending[txNonce]
+                if not ok and (failed is None or index < failed):
+                    failed = index
+
+
+    # send the chunk of the pending transaction with nonce 'txNonce' again,
+    # with the same nonce and a higher gasPrice
+    def _replace(self, pending, txNonce, sent):
+        [index, gas, gasPrice, sentTime, txHashes] = pending[txNonce]
+        if len(txHashes) > self.maxRetries:
+            raise Exception('chunk {0} not mined after {1} replacements'.format(index, len(txHashes) - 1))
+
+        gasPrice = int(gasPrice * self.gasPriceBump)
+        [bhBinary, count] = sent[index]
+        txHash = self.sendChunk(bhBinary, count, txNonce, gas, gasPrice)
+        print('@@@ chunk {0} not mined after {1}s, replaced with gasPrice {2} tx: {3}').format(
+            index, self.receiptTimeout, gasPrice, txHash)
+        pending[txNonce] = [index, gas, gasPrice, time(), txHashes + [txHash]]
+
+
+    # 'gasPrice' defaults to that of the submitter
+    def sendChunk(self, bhBinary, count, nonce, gas, gasPrice=None):
+        if gasPrice is None:
+            gasPrice = self.gasPrice
+        if self.compress:
+            bhBinary = compressHeaders(bhBinary)
+        params = [{
+            'from': self.instance.address,
+            'to': self.relayContract,
+            'data': api.abi_data(BULK_STORE_SIG, [bhBinary, count]),
+            'gas': hex(gas).rstrip('L'),
+            'gasPrice': hex(gasPrice).rstrip('L'),
+            'value': '0x0',
+            'nonce': hex(nonce).rstrip('L')}]
+        return self.instance._rpc_post('eth_sendTransaction', params)
+
+
+    def getReceipt(self, txHash):
+        return self.instance._rpc_post('eth_getTransactionReceipt', [txHash])
@@ -0,0 +1,174 @@
+# Local persistent store of Bitcoin block headers for the relayer.
+#
+# Headers are kept in sqlite keyed by height and hash, with the raw 80 bytes,
+# the cumulative work (computed like the contract's score, from the parent's
+# or, for the first header, seeded from the contract's score) and a flag for whether the header is on the main chain.
+# Once synced, reorg checks, chunk building and restarts can be served from
+# here; only headers from the stored tip onwards need to be fetched again.
+
+import sqlite3
+import threading
+
+from btcHeader import hashHeader, prevHashOf, bitsOf, difficultyFromBits
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS header (
+    hash TEXT PRIMARY KEY,
+    height INTEGER NOT NULL,
+    raw BLOB NOT NULL,
+    cumulWork TEXT,
+    mainChain INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS headerHeight ON header (height, mainChain);
+'''
+
+
+class HeaderStore(object):
+
+    def __init__(self, path):
+        # the relayer fetches headers from several threads
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+
+    def close(self):
+        self.db.close()
+
+
+    # store the binary header 'bhBinary' at 'height'.  If 'mainChain', it
+    # replaces whichever header was on the main chain at that height.
+    # returns the hash of the header
+    def put(self, height, bhBinary, mainChain=True):
+        blockHash = hashHeader(bhBinary)
+        with self.lock:
+            row = self.db.execute('SELECT cumulWork FROM header WHERE hash = ?',
+                (prevHashOf(bhBinary),)).fetchone()
+            cumulWork = None
+            if row is not None and row[0] is not None:
+                cumulWork = str(int(row[0]) + difficultyFromBits(bitsOf(bhBinary)))
+
+            with self.db:
+                if mainChain:
+                    self.db.execute('UPDATE header SET mainChain = 0 WHERE height = ? AND hash != ?',
+                        (height, blockHash))
+                # an already known cumulWork is kept if the parent isn't stored
+                self.db.execute('INSERT OR REPLACE INTO header VALUES (?, ?, ?, '
+                    'COALESCE(?, (SELECT cumulWork FROM header WHERE hash = ?)), ?)',
+                    (blockHash, height, sqlite3.Binary(bhBinary), cumulWork, blockHash, int(mainChain)))
+        return blockHash
+
+
+    # set the cumulative work of an already stored header, eg for the
+    # first header, whose parent is not stored
+    def setCumulWork(self, blockHash, cumulWork):
+        with self.lock, self.db:
+            self.db.execute('UPDATE header SET cumulWork = ? WHERE hash = ?',
+                (str(cumulWork), blockHash))
+
+
+    # recompute the cumulative work of the main chain headers from 'height'
+    # upwards, from their parents: after a reorg, the headers above the fork
+    # were stored with the orphaned branch's work.  A header whose parent's
+    # work is unknown keeps its own.
+    def recomputeWork(self, height):
+        with self.lock, self.db:
+            rows = self.db.execute('SELECT hash, raw FROM header WHERE height >= ? '
+                'AND mainChain = 1 ORDER BY height', (height,)).fetchall()
+            for blockHash, raw in rows:
+                raw = str(raw)
+                row = self.db.execute('SELECT cumulWork FROM header WHERE hash = ?',
+                    (prevHashOf(raw),)).fetchone()
+                if row is not None and row[0] is not None:
+                    self.db.execute('UPDATE header SET cumulWork = ? WHERE hash = ?',
+                        (str(int(row[0]) + difficultyFromBits(bitsOf(raw))), blockHash))
+
+
+    # remove headers at 'height' and above from the main chain, eg when the
+    # network's chain is shorter than the stored one
+    def truncate(self, height):
+        with self.lock, self.db:
+            self.db.execute('UPDATE header SET mainChain = 0 WHERE height >= ?', (height,))
+
+
+    # binary header on the main chain at 'height', or None
+    def getByHeight(self, height):
+        row = self._query('SELECT raw FROM header WHERE height = ? AND mainChain = 1', (height,))
+        return str(row[0]) if row else None
+
+
+    # [height, raw, cumulWork, mainChain] for 'blockHash', or None
+    def getByHash(self, blockHash):
+        row = self._query('SELECT height, raw, cumulWork, mainChain FROM header WHERE hash = ?',
+            (blockHash,))
+        if row is None:
+            return None
+        return [row[0], str(row[1]), int(row[2]) if row[2] is not None else None, row[3] == 1]
+
+
+    # hash of the main chain header at 'height', or None
+    def hashAt(self, height):
+        row = self._query('SELECT hash FROM header WHERE height = ? AND mainChain = 1', (height,))
+        return str(row[0]) if row else None
+
+
+    # height of the highest main chain header, or None if nothing is stored
+    def tipHeight(self):
+        row = self._query('SELECT MAX(height) FROM header WHERE mainChain = 1', ())
+        return row[0]
+
+
+    # concatenated binary main chain headers from 'startHeight' to 'endHeight'
+    # inclusive (ready for bulkStoreHeader), or None if any are missing
+    def headers(self, startHeight, endHeight):
+        with self.lock:
+            rows = self.db.execute('SELECT raw FROM header WHERE height >= ? AND height <= ? '
+                'AND mainChain = 1 ORDER BY height', (startHeight, endHeight)).fetchall()
+        if len(rows) != endHeight - startHeight + 1:
+            return None
+        return ''.join(str(r[0]) for r in rows)
+
+
+    # bring the main chain up to date with the network's, whose tip is at
+    # 'tipHeight'.  'fetchHeaders' is called with a start and end height and
+    # returns an iterable of the binary headers in that range.
+    #
+    # Headers are fetched from the stored tip (or 'startHeight' if nothing is
+    # stored yet) and then, while a header does not link to the stored one
+    # below it, the lower header is refetched: this is what happens on a reorg.
+    # The cumulative work is then recomputed from the lowest refetched header.
+    # 'startWork' is the work of the header at 'startHeight' (eg the contract's
+    # score of its Head) and seeds the work of an empty store.
+    # returns the number of headers fetched
+    def sync(self, fetchHeaders, tipHeight, startHeight=None, startWork=None):
+        storedTip = self.tipHeight()
+        start = storedTip if storedTip is not None else startHeight
+        start = min(start, tipHeight)
+
+        numFetched = 0
+        for height, bhBinary in zip(xrange(start, tipHeight+1), fetchHeaders(start, tipHeight)):
+            self.put(height, bhBinary)
+            numFetched += 1
+
+        if storedTip is None and startWork is not None and self.hashAt(start) is not None:
+            self.setCumulWork(self.hashAt(start), startWork)
+
+        if storedTip is not None and storedTip > tipHeight:
+            self.truncate(tipHeight + 1)
+
+        height = start
+        while self.hashAt(height - 1) is not None and \
+                self.hashAt(height - 1) != prevHashOf(self.getByHeight(height)):
+            height -= 1
+            for bhBinary in fetchHeaders(height, height):
+                self.put(height, bhBinary)
+            numFetched += 1
+
+        self.recomputeWork(height)
+        return numFetched
+
+
+    def _query(self, sql, params):
+        with self.lock:
+            return self.db.execute(sql, params).fetchone()
@@ -0,0 +1,92 @@
+# Offline validation of a batch of Bitcoin block headers, doing the same
+# checks as storeBlockHeader() so that a bad chunk can be rejected before
+# any gas is spent on it:
+#
+# - each header's hashPrevBlock is the hash of the header before it
+# - the block hash is > 0 and < the target from its 'bits'
+#
+# and computing the score that the contract would then store for each header,
+# ie the previous score + 0x00000000FFFF0000...0000 / target
+#
+# Hashing is the expensive part, so it can be spread over 'numProcesses'
+# processes for large ranges.
+
+from multiprocessing import Pool
+
+from btcHeader import HEADER_SIZE, DIFFICULTY_1_TARGET, dblSha256, bitsOf, targetFromBits
+
+
+# the score is the last 16 bytes of a block's _info (see m_setInfo in btcrelay.py)
+SCORE_MODULUS = 2**128
+
+# below this many headers, starting processes costs more than it saves
+MIN_HEADERS_PER_PROCESS = 2000
+
+
+class InvalidHeader(ValueError):
+
+    def __init__(self, index, reason):
+        ValueError.__init__(self, 'header {0}: {1}'.format(index, reason))
+        self.index = index
+        self.reason = reason
+
+
+# block hashes as ints (like m_hashBlockHeader) of the concatenated binary
+# headers 'headersBinary'
+def hashHeaders(headersBinary, numProcesses=0):
+    count = len(headersBinary) / HEADER_SIZE
+    if numProcesses > 1 and count >= 2*MIN_HEADERS_PER_PROCESS:
+        perProcess = -(-count / numProcesses)
+        pool = Pool(numProcesses)
+        try:
+            parts = pool.map(_hashHeaders, [str(buffer(headersBinary, i*HEADER_SIZE, perProcess*HEADER_SIZE))
+                for i in xrange(0, count, perProcess)])
+        finally:
+            pool.terminate()
+        return [blockHash for part in parts for blockHash in part]
+
+    return _hashHeaders(headersBinary)
+
+
+def _hashHeaders(headersBinary):
+    return [int(dblSha256(buffer(headersBinary, offset, HEADER_SIZE))[::-1].encode('hex'), 16)
+        for offset in xrange(0, len(headersBinary), HEADER_SIZE)]
+
+
+# validate the concatenated binary headers 'headersBinary', the first of
+# which must have 'prevHash' (int) as its parent, and a parent score of
+# 'prevScore'.  raises InvalidHeader for the first header that
+# storeBlockHeader would not store.
+# returns the list of scores, one for each header
+def validateHeaders(headersBinary, prevHash, prevScore=0, numProcesses=0):
+    if len(headersBinary) % HEADER_SIZE:
+        raise InvalidHeader(len(headersBinary) / HEADER_SIZE, 'incomplete header')
+
+    hashes = hashHeaders(headersBinary, numProcesses=numProcesses)
+    scores = []
+    score = prevScore
+    for i, blockHash in enumerate(hashes):
+        offset = i * HEADER_SIZE
+        bhPrevHash = int(headersBinary[offset+4:offset+36][::-1].encode('hex'), 16)
+        if bhPrevHash != prevHash:
+            raise InvalidHeader(i, 'does not link to {0:064x}'.format(prevHash))
+
+        target = targetFromBits(bitsOf(headersBinary[offset:offset+HEADER_SIZE]))
+        if not (blockHash > 0 and blockHash < target):
+            raise InvalidHeader(i, 'hash {0:064x} is not below target {1:064x}'.format(blockHash, target))
+
+        score = (score + DIFFICULTY_1_TARGET / target) % SCORE_MODULUS
+        scores.append(score)
+        prevHash = blockHash
+
+    return scores
+
+
+# generator that validates [bhBinary, count] chunks (from makeChunks) as they
+# are consumed, so that nothing after an invalid header is submitted.
+# 'prevHash' (int) is the parent of the first chunk's first header
+def validateChunks(chunks, prevHash):
+    for [bhBinary, count] in chunks:
+        validateHeaders(bhBinary, prevHash)
+        prevHash = _hashHeaders(bhBinary[-HEADER_SIZE:])[0]
+        yield [bhBinary, count]
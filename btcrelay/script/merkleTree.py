@@ -0,0 +1,96 @@
+# Merkle trees of the transactions in a Bitcoin block, for building the
+# proofs that verifyTx() and relayTx() take.
+#
+# All levels of the tree are built once, each as one contiguous string of
+# 32 byte hashes (in Bitcoin's internal byte order), so a proof for any
+# txIndex is just a lookup of one sibling per level.  buildTrees() builds
+# the trees of many blocks with a pool of processes.
+
+from multiprocessing import Pool
+
+from btcHeader import dblSha256
+
+
+HASH_SIZE = 32
+
+
+class MerkleTree(object):
+
+    # 'txids' is the block's tx hashes concatenated in binary (internal byte
+    # order, ie as in the block).  'blockHash' (int) is put in the proofs
+    def __init__(self, txids, blockHash=0, levels=None):
+        if len(txids) == 0 or len(txids) % HASH_SIZE:
+            raise ValueError('txids must be a non-empty concatenation of 32 byte hashes')
+        self.blockHash = blockHash
+        self.numTx = len(txids) / HASH_SIZE
+        self.levels = levels if levels is not None else buildLevels(txids)
+
+
+    # tree of the tx hashes given in the usual hex form, as returned by eg
+    # pybitcointools' get_txs_in_block()
+    @classmethod
+    def fromHexHashes(cls, hashes, blockHash=0):
+        return cls(''.join(h.decode('hex')[::-1] for h in hashes), blockHash)
+
+
+    # the merkle root as an int, as returned by the getMerkleRoot macro
+    def root(self):
+        return _toInt(self.levels[-1], 0)
+
+
+    def txHash(self, txIndex):
+        return _toInt(self.levels[0], txIndex)
+
+
+    # [txHash, txIndex, siblings, txBlockHash] for verifyTx
+    def proof(self, txIndex):
+        if not 0 <= txIndex < self.numTx:
+            raise IndexError('txIndex {0} is not in a block of {1} txs'.format(txIndex, self.numTx))
+
+        siblings = []
+        index = txIndex
+        for level in self.levels[:-1]:
+            siblings.append(_toInt(level, index ^ 1))
+            index >>= 1
+        return [self.txHash(txIndex), txIndex, siblings, self.blockHash]
+
+
+    def proofs(self, txIndexes):
+        return [self.proof(txIndex) for txIndex in txIndexes]
+
+
+# all the levels of the tree of the binary 'txids', from the txids themselves
+# up to the root.  a level with an odd number of hashes (other than the root)
+# has its last hash duplicated, as Bitcoin does
+def buildLevels(txids):
+    level = txids
+    if len(level) > HASH_SIZE and len(level) % (2*HASH_SIZE):
+        level += level[-HASH_SIZE:]
+    levels = [level]
+    while len(level) > HASH_SIZE:
+        level = ''.join(dblSha256(buffer(level, offset, 2*HASH_SIZE))
+            for offset in xrange(0, len(level), 2*HASH_SIZE))
+        if len(level) > HASH_SIZE and len(level) % (2*HASH_SIZE):
+            level += level[-HASH_SIZE:]
+        levels.append(level)
+    return levels
+
+
+# MerkleTrees for 'blocks', a list of [txids, blockHash] as for MerkleTree(),
+# built by 'numProcesses' processes (0 builds them in this process)
+def buildTrees(blocks, numProcesses=0):
+    if numProcesses > 1 and len(blocks) > 1:
+        pool = Pool(numProcesses)
+        try:
+            allLevels = pool.map(buildLevels, [txids for [txids, blockHash] in blocks])
+        finally:
+            pool.terminate()
+    else:
+        allLevels = [buildLevels(txids) for [txids, blockHash] in blocks]
+
+    return [MerkleTree(txids, blockHash, levels=levels)
+        for [txids, blockHash], levels in zip(blocks, allLevels)]
+
+
+def _toInt(level, index):
+    return int(level[index*HASH_SIZE:(index+1)*HASH_SIZE][::-1].encode('hex'), 16)
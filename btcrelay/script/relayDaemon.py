@@ -0,0 +1,269 @@
+# Relayer daemon where fetching, submitting and checking run concurrently.
+#
+# fetchd -d polls every 5 minutes and then fetches, submits, waits for
+# receipts and checks for reorgs one after the other.  Here each of those is a
+# thread, connected by queues:
+#
+#   tip poller       polls the source's tip every 'pollInterval' seconds
+#   fetcher          fetches and validates a chunk of headers as soon as the
+#                    tip is past them, and puts it on the (bounded) submit queue
+#   submitter        sends chunks with explicit nonces, keeping up to
+#                    submitter.maxInFlight transactions pending
+#   receipt tracker  collects receipts; a chunk that failed or was not mined
+#                    in time requests a reconcile
+#   reconciler       checks the contract's Head against the main chain every
+#                    'reconcileInterval' seconds, or when requested
+#
+# So new blocks are relayed within about 'pollInterval' seconds, and a slow
+# Ethereum node only holds up the fetcher once the submit queue is full.
+#
+# Each chunk is tagged with the generation it was fetched in.  A reconcile
+# that changes the contract's Head starts a new generation: fetching
+# restarts after the Head, and chunks of older generations are not sent.
+#
+# This uses threads and Queue (like headerPipeline.py) rather than asyncio,
+# which this Python 2 code doesn't have.
+
+import sys
+from Queue import Queue, Empty, Full
+from threading import Condition, Event, Lock, Thread
+from time import time
+
+from headerValidator import validateHeaders, _hashHeaders
+
+
+CHUNK_SIZE = 5
+RETRY_DELAY = 10  # after an exception in a thread
+
+
+class RelayDaemon(object):
+
+    # 'source' is a header source (see headerSource.py) and 'submitter' a
+    # PipelinedSubmitter whose sendChunk() and getReceipt() are used.
+    # 'getLastBlockHeight' returns the contract's height, and 'reconcile'
+    # fixes an orphaned Head (see fetchd.reconcileHead) and returns True
+    # if it stored anything
+    def __init__(self, source, submitter, getLastBlockHeight, reconcile,
+            chunkSize=CHUNK_SIZE, pollInterval=10, receiptInterval=2,
+            reconcileInterval=60, queueSize=8):
+        self.source = source
+        self.submitter = submitter
+        self.getLastBlockHeight = getLastBlockHeight
+        self.reconcile = reconcile
+        self.chunkSize = chunkSize
+        self.pollInterval = pollInterval
+        self.receiptInterval = receiptInterval
+        self.reconcileInterval = reconcileInterval
+
+        self.submitQueue = Queue(queueSize)
+        self.receiptQueue = Queue()
+        self.pending = {}  # txHash -> [generation, count, gas, time sent]
+
+        # tipHeight, nextHeight, prevHash, generation and numPending are
+        # guarded by 'cond'; the nonce and sending are guarded by 'sendLock'
+        self.cond = Condition()
+        self.sendLock = Lock()
+        self.tipHeight = 0
+        self.nextHeight = 0
+        self.prevHash = 0
+        self.generation = 0
+        self.numPending = 0
+        self.nonce = 0
+
+        self.reconcileNeeded = Event()
+        self.stopping = Event()
+        self.threads = []
+        self.exitError = None  # SystemExit raised by a step [see _loop]
+
+
+    def start(self):
+        self.stopping.clear()
+        self.exitError = None
+        self._reconcile(force=True)
+        self.threads = [Thread(target=self._loop, args=(step,)) for step in [
+            self._pollTip, self._fetch, self._submit, self._trackReceipts, self._reconcileStep]]
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+
+
+    def stop(self):
+        self.stopping.set()
+        with self.cond:
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join()
+
+
+    # block until the daemon stops, which is when a step exits [see _loop].
+    # The SystemExit of that step is then raised here, after the other
+    # threads have stopped
+    def wait(self, interval=1):
+        while not self.stopping.wait(interval):
+            pass
+        self.stop()
+        if self.exitError is not None:
+            raise self.exitError
+
+
+    # run 'step' until stopped; an exception is printed and 'step' retried.
+    # A step that exits (eg reconcile finding a reorg that is too deep)
+    # stops the whole daemon instead of only its own thread
+    def _loop(self, step):
+        while not self.stopping.is_set():
+            try:
+                step()
+            except Exception as e:
+                print('@@@ {0}: {1}').format(step.__name__, e)
+                sys.stdout.flush()
+                self.stopping.wait(RETRY_DELAY)
+            except SystemExit as e:
+                print('@@@ {0} exited, stopping the daemon').format(step.__name__)
+                sys.stdout.flush()
+                self.exitError = e
+                self.stopping.set()
+                with self.cond:
+                    self.cond.notify_all()
+
+
+    def _pollTip(self):
+        tipHeight = self.source.tipHeight()
+        with self.cond:
+            if tipHeight > self.tipHeight:
+                self.tipHeight = tipHeight
+                self.cond.notify_all()
+        self.stopping.wait(self.pollInterval)
+
+
+    # fetch the next chunk once the tip reaches it.  A chunk that ends at the
+    # tip is sent even if it has fewer than chunkSize headers
+    def _fetch(self):
+        with self.cond:
+            while self.nextHeight > self.tipHeight and not self.stopping.is_set():
+                self.cond.wait(1)
+            generation = self.generation
+            startHeight = self.nextHeight
+            prevHash = self.prevHash
+            endHeight = min(self.tipHeight, startHeight + self.chunkSize - 1)
+        if self.stopping.is_set():
+            return
+
+        bhBinary = ''.join(self.source.headers(startHeight, endHeight))
+        validateHeaders(bhBinary, prevHash)
+        chunk = [generation, bhBinary, endHeight - startHeight + 1]
+        while not self._put(self.submitQueue, chunk):
+            if self.stopping.is_set() or generation != self.generation:
+                return
+
+        with self.cond:
+            if generation == self.generation:
+                self.nextHeight = endHeight + 1
+                self.prevHash = _hashHeaders(bhBinary[-80:])[0]
+
+
+    def _submit(self):
+        chunk = self._get(self.submitQueue)
+        if chunk is None:
+            return
+        [generation, bhBinary, count] = chunk
+
+        with self.cond:
+            while self.numPending >= self.submitter.maxInFlight and not self.stopping.is_set():
+                self.cond.wait(1)
+
+        with self.sendLock:
+            if generation != self.generation or self.stopping.is_set():
+                return
+            sizer = self.submitter.sizer
+            gas = sizer.gasFor(count) if sizer else self.submitter.gas
+            txHash = self.submitter.sendChunk(bhBinary, count, self.nonce, gas)
+            print('@@@ sent {0} headers nonce: {1} tx: {2}').format(count, self.nonce, txHash)
+            self.nonce += 1
+            with self.cond:
+                self.numPending += 1
+        self.receiptQueue.put([txHash, generation, count, gas, time()])
+
+
+    def _trackReceipts(self):
+        while True:
+            item = self._get(self.receiptQueue, timeout=None)
+            if item is None:
+                break
+            self.pending[item[0]] = item[1:]
+
+        for txHash, [generation, count, gas, sentTime] in self.pending.items():
+            receipt = self.submitter.getReceipt(txHash)
+            if receipt is None and time() - sentTime < self.submitter.receiptTimeout:
+                continue
+
+            ok = receipt is not None and int(receipt['gasUsed'], 16) < gas
+            if ok:
+                for recorder in [self.submitter.sizer, self.submitter.stats]:
+                    if recorder:
+                        recorder.record(int(receipt['gasUsed'], 16), count)
+
+            del self.pending[txHash]
+            with self.cond:
+                self.numPending -= 1
+                self.cond.notify_all()
+            if not ok and generation == self.generation:
+                print('@@@ tx {0} failed or was not mined, reconciling').format(txHash)
+                self.reconcileNeeded.set()
+
+        self.stopping.wait(self.receiptInterval)
+
+
+    def _reconcileStep(self):
+        lastTime = time()
+        while not self.stopping.is_set() and time() - lastTime < self.reconcileInterval:
+            if self.reconcileNeeded.wait(1):
+                break
+        if self.stopping.is_set():
+            return
+
+        force = self.reconcileNeeded.is_set()
+        self.reconcileNeeded.clear()
+        self._reconcile(force=force)
+
+
+    # reconcile the Head and, if that stored anything or 'force', start a
+    # new generation from the contract's Head
+    def _reconcile(self, force=False):
+        with self.sendLock:
+            if not self.reconcile() and not force:
+                return
+
+            # chunks of the old generation that are still queued are dropped
+            # here, and any put after this are dropped by the submitter
+            while self._get(self.submitQueue, timeout=None) is not None:
+                pass
+
+            height = self.getLastBlockHeight()
+            prevHash = int(self.source.hashAt(height), 16)
+            with self.cond:
+                self.generation += 1
+                self.nextHeight = height + 1
+                self.prevHash = prevHash
+                self.cond.notify_all()
+            self.nonce = self.submitter.instance.transaction_count(defaultBlock='pending')
+            print('@@@ relaying from {0} nonce: {1}').format(height + 1, self.nonce)
+
+
+    # put 'item' on 'queue', returning False if it is still full after 1s
+    def _put(self, queue, item):
+        try:
+            queue.put(item, timeout=1)
+            return True
+        except Full:
+            return False
+
+
+    # the next item of 'queue', or None if there is none within 'timeout'
+    # seconds (or right away if 'timeout' is None)
+    def _get(self, queue, timeout=1):
+        try:
+            if timeout is None:
+                return queue.get_nowait()
+            return queue.get(timeout=timeout)
+        except Empty:
+            return None
@@ -0,0 +1,294 @@
+# Gas benchmarks of the btcrelay contracts.
+#
+# Runs standard scenarios with pyethereum's tester and records the gas and
+# wall time (seconds) of the contract call being measured.  The results are
+# written as JSON and compared against a baseline (test/gasBaseline.json):
+# the run fails if any scenario uses more than 'threshold' more gas.
+#
+# Run from the btcrelay directory, like the tests:
+#   python test/gasBenchmark.py                     # compare against the baseline
+#   python test/gasBenchmark.py --update            # write a new baseline
+#   python test/gasBenchmark.py -o out.json store5 relayTx
+
+from ethereum import tester
+
+import json
+import sys
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+from utilRelay import makeMerkleProof, calldataGas
+
+sys.path.append('script')
+from merkleTree import MerkleTree
+from btcHeader import compressHeaders
+
+
+BASELINE = 'test/gasBaseline.json'
+THRESHOLD = 0.01
+
+ETHER = 10 ** 18
+
+# block 300000
+BLOCK_300K = 0x000000000000000082ccf8f1557c5d40b21edabb18d2d691cfbf87118bac7254
+HEADERS_FROM_300001 = 'test/headers/bh300001.txt'
+
+# block 300017 and its txs
+BLOCK_300017 = {'hash': u'000000000000000032c0ae55f7f52b179a6346bb0d981af55394a3b9cdc556ea', 'merkle_root': u'2fcb4296ba8d2cc5748a9310bac31d2652389c4d70014ccf742d0e4409a612c9'}
+BLOCK_300017_TXS = [u'29d2afa00c4947965717542a9fcf31aa0d0f81cbe590c9b794b8c55d7a4803de', u'84d4e48925445ef3b5722edaad229447f6ef7c77dfdb3b67b288a2e9dac97ebf', u'9f1ddd2fed16b0615d8cdd99456f5229ff004ea93234256571972d8c4eda05dd', u'ca31ee6fecd2d054b85449fb52d2b2bd9f8777b5e603a02d7de53c09e300d127', u'521eabbe29ce215b4b309db7807ed8f655ddb34233b2cfe8178522a335154923', u'a03159699523335896ec6d1ce0a18b247a3373b288cefe6ed5d14ddeeb71db45', u'810a3a390a4b565a54606dd0921985047cf940070b0c61a82225fc742aa4a2e3', u'161400e37071b7096ca6746e9aa388e256d2fe8816cec49cdd73de82f9dae15d', u'af355fbfcf63b67a219de308227dca5c2905c47331a8233613e7f7ac4bacc875', u'1c433a2359318372a859c94ace4cd2b1d5f565ae2c8496ef8255e098c710b9d4', u'49e09d2f48a8f11e13864f7daca8c6b1189507511a743149e16e16bca1858f80', u'5fd034ffd19cda72a78f7bacfd7d9b7b0bc64bc2d3135382db29238aa4d3dd03', u'74ab68a617c8419e6cbae05019a2c81fea6439e233550e5257d9411677845f34', u'df2650bdfcb4efe5726269148828ac18e2a1990c15f7d01d572252656421e896', u'1501aa1dbcada110009fe09e9cec5820fce07e4178af45869358651db4e2b282', u'41f96bb7e58018722c4d0dae2f6f4381bb1d461d3a61eac8b77ffe274b535292', u'aaf9b4e66d5dadb4b4f1107750a18e705ce4b4683e161eb3b1eaa04734218356', u'56639831c523b68cac6848f51d2b39e062ab5ff0b6f2a7dea33765f8e049b0b2', u'3a86f1f34e5d4f8cded3f8b22d6fe4b5741247be7ed164ca140bdb18c9ea7f45', u'da0322e4b634ec8dac5f9b173a2fe7f6e18e5220a27834625a0cfe6d0680c6e8', u'f5d94d46d68a6e953356499eb5d962e2a65193cce160af40200ab1c43228752e', u'e725d4efd42d1213824c698ef4172cdbab683fe9c9170cc6ca552f52244806f6', u'e7711581f7f9028f8f8b915fa0ddb091baade88036bf6f309e2d802043c3231d']
+
+# block 100000, its 6 successors, and its tx[1] (which pays btc-eth.py)
+BLOCK_100K_PREV = 0x000000000002d01c1fccc21636b607dfd930d31d01c3a62104612a1719011250
+HEADERS_FROM_100K = [
+    "0100000050120119172a610421a6c3011dd330d9df07b63616c2cc1f1cd00200000000006657a9252aacd5c0b2940996ecff952228c3067cc38d4885efb5a4ac4247e9f337221b4d4c86041b0f2b5710",
+    "0100000006e533fd1ada86391f3f6c343204b0d278d4aaec1c0b20aa27ba0300000000006abbb3eb3d733a9fe18967fd7d4c117e4ccbbac5bec4d910d900b3ae0793e77f54241b4d4c86041b4089cc9b",
+    "0100000090f0a9f110702f808219ebea1173056042a714bad51b916cb6800000000000005275289558f51c9966699404ae2294730c3c9f9bda53523ce50e9b95e558da2fdb261b4d4c86041b1ab1bf93",
+    "01000000aff7e0c7dc29d227480c2aa79521419640a161023b51cdb28a3b0100000000003779fc09d638c4c6da0840c41fa625a90b72b125015fd0273f706d61f3be175faa271b4d4c86041b142dca82",
+    "01000000e1c5ba3a6817d53738409f5e7229ffd098d481147b002941a7a002000000000077ed2af87aa4f9f450f8dbd15284720c3fd96f565a13c9de42a3c1440b7fc6a50e281b4d4c86041b08aecda2",
+    "0100000079cda856b143d9db2c1caff01d1aecc8630d30625d10e8b4b8b0000000000000b50cc069d6a3e33e3ff84a5c41d9d3febe7c770fdcc96b2c3ff60abe184f196367291b4d4c86041b8fa45d63",
+    "0100000045dc58743362fe8d8898a7506faa816baed7d391c9bc0b13b0da00000000000021728a2f4f975cc801cb3c672747f1ead8a946b2702b7bd52f7b86dd1aa0c975c02a1b4d4c86041b7b47546d"
+]
+BLOCK_100K = {'hash': u'000000000003ba27aa200b1cecaad478d2b00432346c3f1f3986da1afd33e506', 'merkle_root': u'f3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766'}
+BLOCK_100K_TXS = [u'8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87', u'fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4', u'6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4', u'e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d']
+TX_100K_1 = '0100000001032e38e9c0a84c6046d687d10556dcacc41d275ec55fc00779ac88fdf357a187000000008c493046022100c352d3dd993a981beba4a63ad15c209275ca9470abfcd57da93b58e4eb5dce82022100840792bc1f456062819f15d33ee7055cf7b5ee1af1ebcc6028d9cdb1c3af7748014104f46db5e9d61a9dc27b8d64ad23e7383a4e6ca164593c2527c038c0857eb67ee8e825dca65046b82c9331586c82e0fd1f633f25f87c161bc6f8a630121df2b3d3ffffffff0200e32321000000001976a914c398efa9c392ba6013c5e04ee729755ef7f58b3288ac000fe208010000001976a914948c765a6914d43f2a7ac177da2c2f6b52de3d7c88ac00000000'
+
+# a tx with 3 inputs and 2 outputs, from test_btcTx
+TX_3_INS = '0100000003d64e15b7c11f7532059fe6aacc819b5d886e3aaa602078db57cbae2a8f17cde8000000006b483045022027a176130ebf8bf49fdac27cdc83266a68b19c292b08df1be29f3d964c7e90b602210084ae66b4ff5ed342d78102ef8a4bde87b3ded06929ccaf9a8f71b137baa1816a012102270d473b083897519e5f01c47de7ac50877b6a295775f35966922b3571614370ffffffff54f0e7ded00c01082257eda035d65513b509ddbbe05fae19df0065c294822c9d010000006c493046022100f7423fdbcff22d3cd49921d0af92420d548b925bb1671dc826f15ccc5e05c3de022100d60a6178d892bcf012a79cf9e3430ab70a33b3fa2d156ecf541584e44fa83b150121036674d9607e0461b158c4b3d6368d1869e893cd122c68ebe47af253ff686f064effffffffa6155f8b449da0d3f9d2e1bc8e864c8b78615c1fa560076acaee8802d256a6dd010000006c493046022100e220318b55597c80eecccf9b84f37ab287c14277ccccd269d32f863d8d58d403022100f87818cbed15276f0d5be51aed5bd3b8dea934d6dd2244f2c3170369b96f365501210204b08466f452bb42cefc081ca1c773e26ce0a43566bd9d17b30065c1847072f4ffffffff02301bb50e000000001976a914bdb644fddd802bf7388df220279a18abdf65ebb788ac009ccf6f000000001976a914802d61e8496ffc132cdad325c9abf2e7c9ef222b88ac00000000'
+
+# bulkStoreHeader is given this many headers at a time when setting up
+SETUP_CHUNK = 50
+
+
+class Benchmark(object):
+
+    def __init__(self):
+        # high enough for bulkStoreHeader of 120 headers
+        tester.gas_limit = 10**8
+        self.s = tester.state()
+        self.relay = self.s.abi_contract('btcBulkStoreHeaders.py', endowment=2000*ETHER)
+        self.txParser = self.s.abi_contract('btcTx.py')
+        self.snapshot = self.s.snapshot()
+        self.seed = tester.seed
+
+        with open(HEADERS_FROM_300001) as f:
+            self.headers = [f.readline()[:-1].decode('hex') for i in range(1016)]
+
+
+    def reset(self):
+        self.s.revert(self.snapshot)
+        tester.seed = self.seed
+
+
+    # store the first 'count' headers from block 300001.  'indexed' enables
+    # the relay's main chain index
+    def store300K(self, count, indexed=False):
+        if indexed:
+            assert self.relay.enableMainChainIndex() == 1
+        self.relay.setInitialParent(BLOCK_300K, 300000, 1)
+        for i in range(0, count, SETUP_CHUNK):
+            n = min(SETUP_CHUNK, count - i)
+            assert self.relay.bulkStoreHeader(''.join(self.headers[i:i+n]), n) == 300000 + i + n
+
+
+    # with 'calldata', the gas includes that of the transaction's data, which
+    # profiling leaves out
+    def storeHeaders(self, count, indexed=False, compressed=False, calldata=False):
+        if indexed:
+            assert self.relay.enableMainChainIndex() == 1
+        self.relay.setInitialParent(BLOCK_300K, 300000, 1)
+        headersBinary = ''.join(self.headers[:count])
+        if compressed:
+            headersBinary = compressHeaders(headersBinary)
+        res = self.relay.bulkStoreHeader(headersBinary, count, profiling=True)
+        assert res['output'] == 300000 + count
+        if calldata:
+            res['gas'] += calldataGas(self.s.last_tx.data)
+        return res
+
+
+    def storeBlockHeader(self):
+        self.relay.setInitialParent(BLOCK_300K, 300000, 1)
+        res = self.relay.storeBlockHeader(self.headers[0], profiling=True)
+        assert res['output'] == 300001
+        return res
+
+
+    # verifyTx of tx[1] in block 300017, with 'depth' confirmations
+    def verifyTx(self, depth, indexed=False):
+        self.store300K(16 + depth, indexed)
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(BLOCK_300017, BLOCK_300017_TXS, 1)
+        res = self.relay.verifyTx(txHash, txIndex, siblings, txBlockHash, profiling=True)
+        assert res['output'] == 1
+        return res
+
+
+    # verifyTxBatch of 8 txs in block 300017, with 7 confirmations, by a
+    # btcTxRelay.py that verifies with the relay
+    def verifyTxBatch(self):
+        self.store300K(23)
+        txRelay = self.s.abi_contract('btcTxRelay.py')
+        assert txRelay.setTrustedBtcRelay(self.relay.address) == 1
+        proofs = [makeMerkleProof(BLOCK_300017, BLOCK_300017_TXS, i) for i in range(8)]
+        res = txRelay.verifyTxBatch([p[0] for p in proofs], [p[1] for p in proofs],
+            [s for p in proofs for s in p[2]], [len(p[2]) for p in proofs], [p[3] for p in proofs],
+            profiling=True)
+        assert res['output'] == 2**8 - 1
+        return res
+
+
+    # computeMerkle of a proof with 12 levels (ie a block of 4096 txs)
+    def computeMerkle12(self):
+        tree = MerkleTree(''.join(chr(i % 256) + chr(i / 256) + '\x00'*30 for i in range(4096)))
+        [txHash, txIndex, siblings, txBlockHash] = tree.proof(1234)
+        res = self.relay.computeMerkle(txHash, txIndex, siblings, profiling=True)
+        assert res['output'] % 2**256 == tree.root()
+        return res
+
+
+    def within6Confirms(self):
+        self.store300K(23)
+        res = self.relay.within6Confirms(int(BLOCK_300017['hash'], 16), profiling=True)
+        assert res['output'] == 0
+        return res
+
+
+    # relayTx of tx[1] in block 100000 to btc-eth.py, in hex or binary.
+    # 'hashed' uses relayTxBinary and 'outputs' uses relayTxOutputs, of a
+    # btcTxRelay.py that verifies with the relay, and 'calldata' is as for
+    # storeHeaders
+    def relayTx(self, binary=False, hashed=False, outputs=False, calldata=False):
+        btcEth = self.s.abi_contract('btc-eth.py', endowment=2000*ETHER, sender=tester.k1)
+        assert btcEth.setTrustedBtcRelay(self.relay.address, sender=tester.k1) == 1
+
+        self.relay.setInitialParent(BLOCK_100K_PREV, 99999, 1)
+        for i, bhHex in enumerate(HEADERS_FROM_100K):
+            assert self.relay.storeBlockHeader(bhHex.decode('hex')) == 100000 + i
+
+        if hashed or outputs:
+            txRelay = self.s.abi_contract('btcTxRelay.py')
+            assert txRelay.setTrustedBtcRelay(self.relay.address) == 1
+            assert btcEth.setTrustedBtcRelay(txRelay.address, sender=tester.k1) == 1
+
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(BLOCK_100K, BLOCK_100K_TXS, 1)
+        txStr = TX_100K_1.decode('hex') if binary else TX_100K_1
+        if outputs:
+            res = txRelay.relayTxOutputs(TX_100K_1.decode('hex'), txIndex, siblings, txBlockHash, [0, 1], btcEth.address,
+                sender=tester.k2, profiling=True)
+        elif hashed:
+            res = txRelay.relayTxBinary(TX_100K_1.decode('hex'), txIndex, siblings, txBlockHash, btcEth.address,
+                sender=tester.k2, profiling=True)
+        else:
+            res = self.relay.relayTx(txStr, txHash, txIndex, siblings, txBlockHash, btcEth.address,
+                sender=tester.k2, profiling=True)
+        assert res['output'] == 1
+        if calldata:
+            res['gas'] += calldataGas(self.s.last_tx.data)
+        return res
+
+
+    # parseTransaction of the 2nd output of TX_3_INS, in hex or binary
+    def parseTx3Ins(self, binary):
+        if binary:
+            res = self.txParser.parseTransactionBinary(TX_3_INS.decode('hex'), 1, profiling=True)
+            assert res['output'][:2] == [1875876864, 25]
+        else:
+            res = self.txParser.parseTransaction(TX_3_INS, 1, profiling=True)
+            assert res['output'] == [1875876864, 25]
+        return res
+
+
+SCENARIOS = OrderedDict([
+    ('storeBlockHeader', lambda b: b.storeBlockHeader()),
+    ('store1', lambda b: b.storeHeaders(1)),
+    ('store5', lambda b: b.storeHeaders(5)),
+    ('store60', lambda b: b.storeHeaders(60)),
+    ('store120', lambda b: b.storeHeaders(120)),
+    ('store120Indexed', lambda b: b.storeHeaders(120, indexed=True)),
+    ('store120Calldata', lambda b: b.storeHeaders(120, calldata=True)),
+    ('store120Compressed', lambda b: b.storeHeaders(120, compressed=True, calldata=True)),
+    ('verifyTx7', lambda b: b.verifyTx(7)),
+    ('verifyTx30', lambda b: b.verifyTx(30)),
+    ('verifyTx1000', lambda b: b.verifyTx(1000)),
+    ('verifyTx7Indexed', lambda b: b.verifyTx(7, indexed=True)),
+    ('verifyTx1000Indexed', lambda b: b.verifyTx(1000, indexed=True)),
+    ('verifyTxBatch8', lambda b: b.verifyTxBatch()),
+    ('computeMerkle12', lambda b: b.computeMerkle12()),
+    ('within6Confirms', lambda b: b.within6Confirms()),
+    ('relayTx', lambda b: b.relayTx()),
+    ('relayTxBinary', lambda b: b.relayTx(binary=True)),
+    ('relayTxCalldata', lambda b: b.relayTx(calldata=True)),
+    ('relayTxBinaryHashed', lambda b: b.relayTx(hashed=True, calldata=True)),
+    ('relayTxOutputs', lambda b: b.relayTx(outputs=True, calldata=True)),
+    ('parseTxHex3Ins', lambda b: b.parseTx3Ins(False)),
+    ('parseTxBinary3Ins', lambda b: b.parseTx3Ins(True)),
+])
+
+
+# returns {scenario: {'gas': gas, 'time': seconds}} for the 'names' scenarios
+def run(names=None, verbose=False):
+    gasLimit = tester.gas_limit
+    try:
+        bench = Benchmark()
+        results = OrderedDict()
+        for name in names or SCENARIOS.keys():
+            bench.reset()
+            startTime = time.time()
+            res = SCENARIOS[name](bench)
+            results[name] = {'gas': res['gas'], 'time': round(res.get('time', time.time() - startTime), 4)}
+            if verbose:
+                print('{0:20} {1:>10} gas {2:>8.3f} s').format(name, res['gas'], results[name]['time'])
+    finally:
+        tester.gas_limit = gasLimit
+    return results
+
+
+# list of [name, baselineGas, gas] for the scenarios in 'results' that use
+# more than 'threshold' (a fraction) more gas than in 'baseline'
+def regressions(results, baseline, threshold=THRESHOLD):
+    worse = []
+    for name, res in results.items():
+        if name in baseline and res['gas'] > baseline[name]['gas'] * (1 + threshold):
+            worse.append([name, baseline[name]['gas'], res['gas']])
+    return worse
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run (default: all of {0})'.format(', '.join(SCENARIOS)))
+    parser.add_argument('-o', '--out', help='file to write the results to')
+    parser.add_argument('-b', '--baseline', default=BASELINE, help='baseline to compare against')
+    parser.add_argument('-t', '--threshold', default=THRESHOLD, type=float, help='allowed gas increase, as a fraction')
+    parser.add_argument('--update', action='store_true', help='write the results to the baseline')
+    args = parser.parse_args()
+
+    results = run(args.scenarios, verbose=True)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update:
+        baseline = OrderedDict()
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f, object_pairs_hook=OrderedDict)
+        except IOError:
+            pass
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    worse = regressions(results, baseline, args.threshold)
+    for name, baselineGas, gas in worse:
+        print('@@@ {0} gas {1} -> {2} (+{3:.1%})').format(name, baselineGas, gas, float(gas) / baselineGas - 1)
+    if worse:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
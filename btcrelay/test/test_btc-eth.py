@@ -2,6 +2,8 @@ from ethereum import tester
 
 from bitcoin import *
 
+from utilRelay import BLOCK_GAS_LIMIT
+
 
 import datetime
 import struct
@@ -21,7 +23,7 @@ class TestBtcEth(object):
 
 
     def setup_class(cls):
-        tester.gas_limit = 2 * 10**6
+        tester.gas_limit = BLOCK_GAS_LIMIT
         cls.s = tester.state()
         cls.c = cls.s.abi_contract(cls.CONTRACT, endowment=2000*cls.ETHER)
         cls.snapshot = cls.s.snapshot()
@@ -45,6 +47,52 @@ class TestBtcEth(object):
         expEtherBalance = 13
         assert userEthBalance == expEtherBalance
 
+    def testTransferBinary(self):
+        assert self.c.setTrustedBtcRelay(self.s.block.coinbase) == 1
+        assert self.c.testingonlySetBtcAddr(0xc398efa9c392ba6013c5e04ee729755ef7f58b32) == 1
+
+        res = self.c.processTransaction(self.TX_STR.decode('hex'), self.TX_HASH, profiling=True)
+        print('GAS: '+str(res['gas']))
+        assert(res['output'] == 1)
+
+        expEtherAddr = '948c765a6914d43f2a7ac177da2c2f6b52de3d7c'
+        assert self.s.block.get_balance(expEtherAddr) == 13
+
+        # output 0 is not to btcAcceptAddr
+        assert self.c.testingonlySetBtcAddr(0x948c765a6914d43f2a7ac177da2c2f6b52de3d7c) == 1
+        assert self.c.processTransaction(self.TX_STR.decode('hex'), self.TX_HASH + 1) == 0
+
+        # only 1 output
+        assert self.c.processTransaction(self.TX_STR.decode('hex')[:-38], self.TX_HASH + 2) == 0
+
+
+    # the first 2 outputs of TX_STR, as relayTxOutputs() gives them
+    def outputsOfTx(self):
+        script = lambda addr: int('76a914' + addr + '88ac' + '00'*7, 16)
+        return [0x2123e300, script('c398efa9c392ba6013c5e04ee729755ef7f58b32'), 25,
+            0x108e20f00, script('948c765a6914d43f2a7ac177da2c2f6b52de3d7c'), 25]
+
+    def testProcessOutputs(self):
+        assert self.c.setTrustedBtcRelay(self.s.block.coinbase) == 1
+        assert self.c.testingonlySetBtcAddr(0xc398efa9c392ba6013c5e04ee729755ef7f58b32) == 1
+
+        res = self.c.processOutputs(self.TX_HASH, [0, 1], self.outputsOfTx(), profiling=True)
+        print('GAS: '+str(res['gas']))
+        assert res['output'] == 1
+        assert self.s.block.get_balance('948c765a6914d43f2a7ac177da2c2f6b52de3d7c') == 13
+
+        # they must be outputs 0 and 1
+        assert self.c.processOutputs(self.TX_HASH + 1, [1, 2], self.outputsOfTx()) == 0
+        assert self.c.processOutputs(self.TX_HASH + 1, [0], self.outputsOfTx()[:3]) == 0
+
+        # not enough BTC
+        outputs = self.outputsOfTx()
+        outputs[0] = 5 * 10**8 - 1
+        assert self.c.processOutputs(self.TX_HASH + 1, [0, 1], outputs) == 0
+
+        assert self.c.processOutputs(self.TX_HASH, [0, 1], self.outputsOfTx(), sender=tester.k1) == 0
+
+
     def testUntrustedCaller(self):
         res = self.c.processTransaction(self.TX_STR, self.TX_HASH, sender=tester.k1)
         assert res == 0
@@ -1,7 +1,11 @@
 from ethereum import tester
 from datetime import datetime, date
 
-from utilRelay import makeMerkleProof, dblSha256Flip
+from utilRelay import makeMerkleProof, dblSha256Flip, calldataGas, BLOCK_GAS_LIMIT
+
+import sys
+sys.path.append('script')
+from btcHeader import compressHeaders, decompressHeaders
 
 import pytest
 slow = pytest.mark.slow
@@ -36,6 +40,51 @@ class TestBtcBulkStoreHeaders(object):
         self.checkRelay(txStr, txIndex, btcAddr, hh)
 
 
+    # the binary tx is parsed in memory by btc-eth.py, instead of with
+    # a call for each field as with the hex
+    def testTx8InsBinary(self):
+        hh = self.bulkStore10From300K()
+
+        txIndex = 216
+        txStr = TX_8_INS_300K
+        btcAddr = 0x4a0fe1a4b5bbe9dfbe878b64e136735d6cc083e5
+        stored = self.s.snapshot()
+        hexGas = self.checkRelay(txStr, txIndex, btcAddr, hh)
+        self.s.revert(stored)
+        binaryGas = self.checkRelay(txStr, txIndex, btcAddr, hh, binary=True)
+        print('@@@ relayTx gas hex: {0} binary: {1}').format(hexGas, binaryGas)
+        assert binaryGas * 3 < hexGas * 2
+
+
+    # relayTxBinary hashes the tx instead of it being passed in, and its
+    # calldata is about half that of relayTx's hex tx
+    def testTx8InsRelayTxBinary(self):
+        hh = self.bulkStore10From300K()
+
+        txIndex = 216
+        txStr = TX_8_INS_300K
+        btcAddr = 0x4a0fe1a4b5bbe9dfbe878b64e136735d6cc083e5
+        stored = self.s.snapshot()
+        hexGas = self.checkRelay(txStr, txIndex, btcAddr, hh)
+        hexGas += calldataGas(self.s.last_tx.data)
+        self.s.revert(stored)
+        hashedGas = self.checkRelay(txStr, txIndex, btcAddr, hh, binary=True, hashed=True)
+        hashedGas += calldataGas(self.s.last_tx.data)
+        print('@@@ gas with calldata relayTx hex: {0} relayTxBinary: {1}').format(hexGas, hashedGas)
+        assert hashedGas * 3 < hexGas * 2
+
+        # a tx that is not the one in the block isn't relayed
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(hh[0], hh[1], txIndex)
+        BTC_ETH = self.s.abi_contract('btc-eth.py', endowment=2000*self.ETHER, sender=tester.k1)
+        txRelay = self.txRelay()
+        assert BTC_ETH.setTrustedBtcRelay(txRelay.address, sender=tester.k1) == 1
+        txBytes = txStr.decode('hex')
+        assert 0 == txRelay.relayTxBinary(txBytes[:-1] + '\x01', txIndex, siblings, txBlockHash, BTC_ETH.address, sender=tester.k1)
+
+        # only the owner sets the relay that verifies the txs
+        assert 0 == txRelay.setTrustedBtcRelay(BTC_ETH.address, sender=tester.k1)
+
+
     # this is a static test.  for a broader test,
     # there's a veryslow dynamic test that calls randomTxVerify in test_txVerify.py
     @slow
@@ -53,7 +102,7 @@ class TestBtcBulkStoreHeaders(object):
         self.checkRelay(txStr, txIndex, btcAddr, hh)
 
         txIndex = 216
-        txStr = '0100000008e8cd5987582c32393e41358baf37c1558de6ab061be42a497692cdea5784b1e9000000006b483045022100d44a3d698afde6df43f6a2387d6356716dde81e743676d8abe6efc0f7a196a56022036cc81b319a24605463a47a2f0605a9e1496a26e71990ef32301b118f53691ab0121033a6942b7436d179f1fa03434fc2b0f7e66841f826cd2d61a3472487c06125f3bffffffff2e17d5b8ccc0d7a4a3d009d52705be770513a47dba906eb505c8396d66df3811000000006a47304402203327261d1740dd33d0ca10a7e28ddb2862ed05dffaf81d685151e019a3e751fb0220185b9537123789b2c5200bb4f0aa098dfe6ffbc627537b6aaac5357369d4cf9c0121024276cb31dcdc70e06e6cd6e562283344e8fcf68f267dd199b3c8f140cd4d13c8ffffffff8d5929ffe66222b8cd3414a20ecfcea7d4a711100f41d762d56d825d7a786f71010000006a4730440220751c8bf1ba2d9fe5eed684d83d2083e0f083d55f338c71677e23917ee32dd06c022063e0542d41632d8e3a011fbe583a7728677e47f85cbc343441c2f111ef6c314b01210264af1414a01efb0c0381767acc16cf5f271ba49d3a3272b60520da7c95a85c2bffffffff2268b04342ecd75f79e6f14ea4c1ec11e22d7b649512f369400c17e3a860affc010000006b483045022100f5a817f1a03694d274e1c504f419c689d3e3d0823ced260dad6198dcf1b39256022042a027133f67606b349b228b29c5435dd294872d5feb122ade756e3e237a937e012103fff38371a436bbfd74b19d315d367625f38b68b2f785b53369108cf49da60f4bffffffffc23512daf04dc476a7b3b5f3ff7bbf7ae04364f31903163ad5b53602d342a4b7010000006b483045022100c74e3f77e4e7dd5f89a534612d8b09b3424094eda2ab974811285809c1e3b0b3022012f1d330b4c5b78127f2aa8bf2ea95ffe46491b5f59c17257c474ce620a72e0201210301c0b0cc55c74009051ad4f91ada8b57223cd1d56eaf87cc15363fc7c7041150ffffffffc3fba4804928ca0d22f1c74d722e817fe4011999d0dbfd5f748108011104fafd000000006b483045022100e15317e47d656da19c832af9cab8248bc1bd28fd3536227cec45b8ed28757c1b02202981cdb408577ee31d4e0c8fdc11e76bc97dd504ee9ce0299b10a605e9f58b75012103bd1b995eeba595c304d5e2ebe22ac793c1a355729e99bb0218820b6b0a284cbfffffffff8f091001be58b491b753bde74f1b3938b2674ef2f4db4c2cb509dabd392cb9bd000000006a47304402205090d866742584a66fa8663addcae8e089c9d13fb104b9e466d6ce20ed01e502022003649ec623e72e93fa7d7afafd9eeec9b8214e068011af126a5d1f4e7659b8f301210257bd210ebbe37034dd9823603ba3f6776f61c16d9b5969f465e4c256546ae453ffffffffe03387cbf249d6e15b8ff59975879e491d11b31e8ad5765392aaa544d3203197010000006b483045022100bf8874e4dbdbfc75b19e97f2e0ea5b46b9febb5f84aaf4fd4620031b9571f48d02201c60c69f476990848f1066e0ccc8e2f3dc2d90c329670c4b51debdd17494688d012103353989af6f20bab1c63ac8f87cf0365347b66ca490650154a2da8437d679bd7cffffffff023f9d6923000000001976a9144a0fe1a4b5bbe9dfbe878b64e136735d6cc083e588acc3a50f00000000001976a91409ca07592f3e5b404b9c490422f469216203f19688ac00000000'
+        txStr = TX_8_INS_300K
         btcAddr = 0x4a0fe1a4b5bbe9dfbe878b64e136735d6cc083e5
         self.checkRelay(txStr, txIndex, btcAddr, hh)
 
@@ -79,6 +128,119 @@ class TestBtcBulkStoreHeaders(object):
         assert blockDifficulty == 10
 
 
+    # headers of 500from300k.txt, the first being block 300000
+    def headersFrom300K(self, count):
+        with open("test/headers/500from300k.txt") as f:
+            return [f.readline().strip().decode('hex') for i in range(count)]
+
+
+    # the deploy files create the relay with 3M gas, under the 3141592 block
+    # gas limit
+    def testCreateGas(self):
+        gasLimit = tester.gas_limit
+        tester.gas_limit = BLOCK_GAS_LIMIT
+        try:
+            s = tester.state()
+            s.abi_contract(self.CONTRACT)
+            print('@@@ create gas: {0}').format(s.block.gas_used)
+            assert s.block.gas_used < 3 * 10**6
+        finally:
+            tester.gas_limit = gasLimit
+
+
+    # the same state as storing the headers one at a time
+    def testBulkMatchesStoreBlockHeader(self):
+        block300kPrev = 0x000000000000000067ecc744b5ae34eebbde14d21ca4db51652e4d67e155f07e
+        headers = self.headersFrom300K(20)
+
+        self.c.setInitialParent(block300kPrev, 299999, 1)
+        for bh in headers:
+            self.c.storeBlockHeader(bh)
+        expected = self.chainState(headers)
+
+        self.s.revert(self.snapshot)
+        self.c.setInitialParent(block300kPrev, 299999, 1)
+        assert self.c.bulkStoreHeader(''.join(headers[:7]), 7) == 300006
+        assert self.c.bulkStoreHeader(''.join(headers[7:]), 13) == 300019
+        assert self.chainState(headers) == expected
+
+
+    def chainState(self, headers):
+        hashes = [dblSha256Flip(bh) for bh in headers]
+        return [self.c.getBlockchainHead(), self.c.getLastBlockHeight(),
+            self.c.getCumulativeDifficulty(), self.c.getAverageBlockDifficulty(),
+            [self.c.within6Confirms(h) for h in hashes],
+            [self.c.inMainChain(h) for h in hashes]]
+
+
+    # headers already stored are skipped, and the ones after them are stored
+    def testBulkStoreOverlap(self):
+        block300kPrev = 0x000000000000000067ecc744b5ae34eebbde14d21ca4db51652e4d67e155f07e
+        headers = self.headersFrom300K(15)
+        self.c.setInitialParent(block300kPrev, 299999, 1)
+
+        assert self.c.bulkStoreHeader(''.join(headers[:10]), 10) == 300009
+        assert self.c.bulkStoreHeader(''.join(headers[5:15]), 10) == 300014
+        assert self.c.getBlockchainHead() == dblSha256Flip(headers[14])
+
+        # nothing new
+        assert self.c.bulkStoreHeader(''.join(headers[:3]), 3) == 0
+        assert self.c.getBlockchainHead() == dblSha256Flip(headers[14])
+
+
+    # the headers before one that fails its target are kept
+    def testBulkStoreInvalidHeader(self):
+        block300kPrev = 0x000000000000000067ecc744b5ae34eebbde14d21ca4db51652e4d67e155f07e
+        headers = self.headersFrom300K(6)
+        headers[3] = headers[3][:76] + '\x00\x00\x00\x00'  # nonce
+        self.c.setInitialParent(block300kPrev, 299999, 1)
+
+        # the whole batch fails, so none of the valid headers before it are
+        # stored either
+        with pytest.raises(Exception):
+            self.c.bulkStoreHeader(''.join(headers), 6)
+        assert self.c.getLastBlockHeight() == 299999
+        assert self.c.getBlockchainHead() == block300kPrev
+
+        # as does a header whose parent is not stored
+        with pytest.raises(Exception):
+            self.c.bulkStoreHeader(headers[0] + headers[2], 2)
+        assert self.c.getLastBlockHeight() == 299999
+
+        assert self.c.bulkStoreHeader(''.join(headers[:3]), 3) == 300002
+
+
+    # compressed headers give the same state, with less calldata and gas
+    def testBulkStoreCompressed(self):
+        block300kPrev = 0x000000000000000067ecc744b5ae34eebbde14d21ca4db51652e4d67e155f07e
+        headers = self.headersFrom300K(20)
+        headersBinary = ''.join(headers)
+        compressed = compressHeaders(headersBinary)
+        assert len(compressed) == 80 + 19*48
+        assert decompressHeaders(compressed) == headersBinary
+
+        # rebuilding the headers costs a little more to execute, so the gas
+        # compared includes that of the calldata
+        self.c.setInitialParent(block300kPrev, 299999, 1)
+        gasUsed = self.s.block.gas_used
+        assert self.c.bulkStoreHeader(headersBinary, 20) == 300019
+        gas = self.s.block.gas_used - gasUsed
+        expected = self.chainState(headers)
+
+        self.s.revert(self.snapshot)
+        self.c.setInitialParent(block300kPrev, 299999, 1)
+        gasUsed = self.s.block.gas_used
+        assert self.c.bulkStoreHeader(compressed, 20) == 300019
+        compressedGas = self.s.block.gas_used - gasUsed
+        assert self.chainState(headers) == expected
+
+        print('@@@ gas full: {0} compressed: {1}').format(gas, compressedGas)
+        assert compressedGas < gas
+
+        # neither 20 full headers nor 20 compressed ones
+        assert self.c.bulkStoreHeader(compressed[:-48], 20) == 0
+
+
     def bulkStore11FromGenesis(self):
         numBlock = 11
         self.c.setInitialParent(0, 0, 1)
@@ -129,10 +291,19 @@ class TestBtcBulkStoreHeaders(object):
 
         return [header, hashes]
 
+    # a btcTxRelay.py that verifies txs with this relay
+    def txRelay(self):
+        txRelay = self.s.abi_contract('btcTxRelay.py')
+        assert txRelay.setTrustedBtcRelay(self.c.address) == 1
+        return txRelay
+
     # this is consistent with the assumption that the ether address is the output
     # following the 'btcAddr' and that the outputs are standard scripts
     # (OP_DUP OP_HASH160 <address> OP_EQUALVERIFY OP_CHECKSIG)
-    def checkRelay(self, txStr, txIndex, btcAddr, hh):
+    # returns the gas used by relayTx.  'binary' relays 'txStr' in binary,
+    # and 'hashed' relays it with relayTxBinary, which computes its hash.
+    # The relay's last transaction has the same data as the one measured
+    def checkRelay(self, txStr, txIndex, btcAddr, hh, binary=False, hashed=False):
         [header, hashes] = hh
         [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(header, hashes, txIndex)
 
@@ -140,9 +311,16 @@ class TestBtcBulkStoreHeaders(object):
         # verify the proof and then hand the proof to the btc-eth contract, which will check
         # the tx outputs and send ether as appropriate
         BTC_ETH = self.s.abi_contract('btc-eth.py', endowment=2000*self.ETHER, sender=tester.k1)
-        assert BTC_ETH.setTrustedBtcRelay(self.c.address, sender=tester.k1) == 1
+        # relayTxBinary is in btcTxRelay, which the exchange trusts instead
+        relayer = self.txRelay() if hashed else self.c
+        assert BTC_ETH.setTrustedBtcRelay(relayer.address, sender=tester.k1) == 1
         assert BTC_ETH.testingonlySetBtcAddr(btcAddr, sender=tester.k1) == 1
-        res = self.c.relayTx(txStr, txHash, txIndex, siblings, txBlockHash, BTC_ETH.address, profiling=True)
+        txRelayed = txStr.decode('hex') if binary else txStr
+        if hashed:
+            relay = lambda **kw: relayer.relayTxBinary(txRelayed, txIndex, siblings, txBlockHash, BTC_ETH.address, **kw)
+        else:
+            relay = lambda **kw: self.c.relayTx(txRelayed, txHash, txIndex, siblings, txBlockHash, BTC_ETH.address, **kw)
+        res = relay(profiling=True)
 
         indexOfBtcAddr = txStr.find(format(btcAddr, 'x'))
         ethAddrBin = txStr[indexOfBtcAddr+68:indexOfBtcAddr+108].decode('hex') # assumes ether addr is after btcAddr
@@ -156,7 +334,8 @@ class TestBtcBulkStoreHeaders(object):
         # exchange contract is owned by tester.k1, while
         # relay contract is owned by tester.k0
         # Thus k0 is NOT allowed to reclaim ether using the same tx
-        assert 0 == self.c.relayTx(txStr, txHash, txIndex, siblings, txBlockHash, BTC_ETH.address)
+        assert 0 == relay()
+        return res['gas']
 
 
 
@@ -261,3 +440,7 @@ class TestBtcBulkStoreHeaders(object):
         res = self.c.bulkStoreHeader(headerBins, count, profiling=True)
         print('GAS: '+str(res['gas']))
         assert res['output'] == count-1 + 100000
+
+
+# tx[216] of block 300000: 8 ins, 2 outs
+TX_8_INS_300K = '0100000008e8cd5987582c32393e41358baf37c1558de6ab061be42a497692cdea5784b1e9000000006b483045022100d44a3d698afde6df43f6a2387d6356716dde81e743676d8abe6efc0f7a196a56022036cc81b319a24605463a47a2f0605a9e1496a26e71990ef32301b118f53691ab0121033a6942b7436d179f1fa03434fc2b0f7e66841f826cd2d61a3472487c06125f3bffffffff2e17d5b8ccc0d7a4a3d009d52705be770513a47dba906eb505c8396d66df3811000000006a47304402203327261d1740dd33d0ca10a7e28ddb2862ed05dffaf81d685151e019a3e751fb0220185b9537123789b2c5200bb4f0aa098dfe6ffbc627537b6aaac5357369d4cf9c0121024276cb31dcdc70e06e6cd6e562283344e8fcf68f267dd199b3c8f140cd4d13c8ffffffff8d5929ffe66222b8cd3414a20ecfcea7d4a711100f41d762d56d825d7a786f71010000006a4730440220751c8bf1ba2d9fe5eed684d83d2083e0f083d55f338c71677e23917ee32dd06c022063e0542d41632d8e3a011fbe583a7728677e47f85cbc343441c2f111ef6c314b01210264af1414a01efb0c0381767acc16cf5f271ba49d3a3272b60520da7c95a85c2bffffffff2268b04342ecd75f79e6f14ea4c1ec11e22d7b649512f369400c17e3a860affc010000006b483045022100f5a817f1a03694d274e1c504f419c689d3e3d0823ced260dad6198dcf1b39256022042a027133f67606b349b228b29c5435dd294872d5feb122ade756e3e237a937e012103fff38371a436bbfd74b19d315d367625f38b68b2f785b53369108cf49da60f4bffffffffc23512daf04dc476a7b3b5f3ff7bbf7ae04364f31903163ad5b53602d342a4b7010000006b483045022100c74e3f77e4e7dd5f89a534612d8b09b3424094eda2ab974811285809c1e3b0b3022012f1d330b4c5b78127f2aa8bf2ea95ffe46491b5f59c17257c474ce620a72e0201210301c0b0cc55c74009051ad4f91ada8b57223cd1d56eaf87cc15363fc7c7041150ffffffffc3fba4804928ca0d22f1c74d722e817fe4011999d0dbfd5f748108011104fafd000000006b483045022100e15317e47d656da19c832af9cab8248bc1bd28fd3536227cec45b8ed28757c1b02202981cdb408577ee31d4e0c8fdc11e76bc97dd504ee9ce0299b10a605e9f58b75012103bd1b995eeba595c304d5e2ebe22ac793c1a355729e99bb0218820b6b0a284cbfffffffff8f091001be58b491b753bde74f1b3938b2674ef2f4db4c2cb509dabd392cb9bd000000006a47304402205090d866742584a66fa8663addcae8e089c9d13fb104b9e466d6ce20ed01e502022003649ec623e72e93fa7d7afafd9eeec9b8214e068011af126a5d1f4e7659b8f301210257bd210ebbe37034dd9823603ba3f6776f61c16d9b5969f465e4c256546ae453ffffffffe03387cbf249d6e15b8ff59975879e491d11b31e8ad5765392aaa544d3203197010000006b483045022100bf8874e4dbdbfc75b19e97f2e0ea5b46b9febb5f84aaf4fd4620031b9571f48d02201c60c69f476990848f1066e0ccc8e2f3dc2d90c329670c4b51debdd17494688d012103353989af6f20bab1c63ac8f87cf0365347b66ca490650154a2da8437d679bd7cffffffff023f9d6923000000001976a9144a0fe1a4b5bbe9dfbe878b64e136735d6cc083e588acc3a50f00000000001976a91409ca07592f3e5b404b9c490422f469216203f19688ac00000000'
@@ -2,6 +2,8 @@ from ethereum import tester
 from datetime import datetime, date
 import math
 
+from utilRelay import BLOCK_GAS_LIMIT
+
 import pytest
 slow = pytest.mark.slow
 
@@ -16,7 +18,7 @@ class TestBtcChain(object):
 
 
     def setup_class(cls):
-        tester.gas_limit = int(2.25e6)
+        tester.gas_limit = BLOCK_GAS_LIMIT
         cls.s = tester.state()
         cls.c = cls.s.abi_contract(cls.CONTRACT, endowment=2000*cls.ETHER)
         cls.snapshot = cls.s.snapshot()
@@ -86,6 +88,25 @@ class TestBtcChain(object):
         for i in range(numBlocksInFork):
             assert self.c.inMainChain(forkStartBlock+i) == 0
 
+    # the ancestors saved are the same as by the definition: the parent if
+    # (height - 1) is a multiple of the level's depth, otherwise the parent's
+    def testAncestorWords(self):
+        c = self.s.abi_contract('btcrelay_test.py')
+        numBlocks = 130
+        depths = [5**i for i in range(8)]
+
+        # block i has height i and internalBlock index i-1 (block 0 is not
+        # stored, so its index also reads as 0)
+        expAnc = {0: [0]*8}
+        for i in range(1, numBlocks+1):
+            c.saveAncestors(i, i-1)
+            prevIndex = max(i-2, 0)
+            expAnc[i] = [prevIndex if (i-1) % d == 0 else expAnc[i-1][level]
+                for level, d in enumerate(depths)]
+
+        for i in [1, 2, 5, 6, 7, 25, 26, 27, 51, 125, 126, 127, 130]:
+            assert [c.getAncestor(i, level) for level in range(8)] == expAnc[i]
+
     def testTiny(self):
 
         self.c.saveAncestors(1, 0)
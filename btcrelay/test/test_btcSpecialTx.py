@@ -24,6 +24,23 @@ class TestBtcSpecialTx(object):
         tester.seed = self.seed
 
 
+    def testGetOutputsBinary(self):
+        # 3 outputs
+        txStr = '01000000015f43d26fc7ea7049a2fc63a5cd47e767ac1f8cd8bf388045e06dc5faab9e9756010000006b483045022100a51893da50d180cd3481625ce7193a43cf54b9c5ca6eedda75cef471c1afc19c022008255285e37be092ce9d793f8430cef6cc1ad12de50c56a870ee6b443f6068eb012103481e57ba7df07d0b29a827a2380f83bd349002fab509bc865c62f43e79baeb33ffffffff0356dffdfd000000001976a914c9dea40941945cf8a8955c4ee3be117d195df0f488ac20ebb304000000001976a914a9a955323f97ec609bc334fc65cc700913aa66e688acccef9201000000001976a9146f4664e7632d6e2fefc065e540eba4b71ebb371f88ac00000000'
+        txBytes = txStr.decode('hex')
+
+        [satoshis, out1stScriptIndex, out2ndScriptIndex] = self.c.getFirst2Outputs(txStr)
+        assert self.c.getOutputsBinary(txBytes, [0, 1]) == [satoshis, out1stScriptIndex, 25, 0x04b3eb20, out2ndScriptIndex, 25]
+
+        res = self.c.getOutputsBinary(txBytes, [0, 2])
+        assert res[:3] == [satoshis, out1stScriptIndex, 25]
+        assert res[3] == 0x0192efcc
+        assert txBytes[res[4]+3:res[4]+23].encode('hex') == '6f4664e7632d6e2fefc065e540eba4b71ebb371f'
+
+        assert self.c.getOutputsBinary(txBytes, [2, 3]) == []
+        assert self.c.getOutputsBinary(txBytes[:-30], [2]) == []
+
+
     def test_testnetTx(self):
         # testnet tx a51a71f8094f9b4e266fcccd55068e809277ec79bfa44b7bdb8f1355e9bb8460
         #    tx[9] of block 350559
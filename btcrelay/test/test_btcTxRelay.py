@@ -0,0 +1,179 @@
+from ethereum import tester
+
+from utilRelay import makeMerkleProof, BLOCK_GAS_LIMIT
+
+import struct
+from hashlib import sha256
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestBtcTxRelay(object):
+
+    CONTRACT = 'btcTxRelay.py'
+    RELAY = 'btcBulkStoreHeaders.py'
+
+    ETHER = 10 ** 18
+
+    # block 100000 and its 6 successors
+    BLOCK_100K_PREV = 0x000000000002d01c1fccc21636b607dfd930d31d01c3a62104612a1719011250
+    HEADERS = [
+        "0100000050120119172a610421a6c3011dd330d9df07b63616c2cc1f1cd00200000000006657a9252aacd5c0b2940996ecff952228c3067cc38d4885efb5a4ac4247e9f337221b4d4c86041b0f2b5710",
+        "0100000006e533fd1ada86391f3f6c343204b0d278d4aaec1c0b20aa27ba0300000000006abbb3eb3d733a9fe18967fd7d4c117e4ccbbac5bec4d910d900b3ae0793e77f54241b4d4c86041b4089cc9b",
+        "0100000090f0a9f110702f808219ebea1173056042a714bad51b916cb6800000000000005275289558f51c9966699404ae2294730c3c9f9bda53523ce50e9b95e558da2fdb261b4d4c86041b1ab1bf93",
+        "01000000aff7e0c7dc29d227480c2aa79521419640a161023b51cdb28a3b0100000000003779fc09d638c4c6da0840c41fa625a90b72b125015fd0273f706d61f3be175faa271b4d4c86041b142dca82",
+        "01000000e1c5ba3a6817d53738409f5e7229ffd098d481147b002941a7a002000000000077ed2af87aa4f9f450f8dbd15284720c3fd96f565a13c9de42a3c1440b7fc6a50e281b4d4c86041b08aecda2",
+        "0100000079cda856b143d9db2c1caff01d1aecc8630d30625d10e8b4b8b0000000000000b50cc069d6a3e33e3ff84a5c41d9d3febe7c770fdcc96b2c3ff60abe184f196367291b4d4c86041b8fa45d63",
+        "0100000045dc58743362fe8d8898a7506faa816baed7d391c9bc0b13b0da00000000000021728a2f4f975cc801cb3c672747f1ead8a946b2702b7bd52f7b86dd1aa0c975c02a1b4d4c86041b7b47546d"
+    ]
+    BLOCK_100K = {'hash': u'000000000003ba27aa200b1cecaad478d2b00432346c3f1f3986da1afd33e506', 'merkle_root': u'f3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766'}
+    BLOCK_100K_TXS = [u'8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87', u'fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4', u'6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4', u'e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d']
+
+    # tx[1] of block 100000, which pays 13 wei from btc-eth to its 2nd output
+    TX_BYTES = '0100000001032e38e9c0a84c6046d687d10556dcacc41d275ec55fc00779ac88fdf357a187000000008c493046022100c352d3dd993a981beba4a63ad15c209275ca9470abfcd57da93b58e4eb5dce82022100840792bc1f456062819f15d33ee7055cf7b5ee1af1ebcc6028d9cdb1c3af7748014104f46db5e9d61a9dc27b8d64ad23e7383a4e6ca164593c2527c038c0857eb67ee8e825dca65046b82c9331586c82e0fd1f633f25f87c161bc6f8a630121df2b3d3ffffffff0200e32321000000001976a914c398efa9c392ba6013c5e04ee729755ef7f58b3288ac000fe208010000001976a914948c765a6914d43f2a7ac177da2c2f6b52de3d7c88ac00000000'.decode('hex')
+    ETH_ADDR = '948c765a6914d43f2a7ac177da2c2f6b52de3d7c'
+
+    def setup_class(cls):
+        tester.gas_limit = BLOCK_GAS_LIMIT
+        cls.s = tester.state()
+        cls.relay = cls.s.abi_contract(cls.RELAY)
+        cls.c = cls.s.abi_contract(cls.CONTRACT)
+        assert cls.c.setTrustedBtcRelay(cls.relay.address) == 1
+
+        cls.relay.setInitialParent(cls.BLOCK_100K_PREV, 99999, 1)
+        headersBinary = ''.join(bhHex.decode('hex') for bhHex in cls.HEADERS)
+        assert cls.relay.bulkStoreHeader(headersBinary, len(cls.HEADERS)) == 100000 + len(cls.HEADERS) - 1
+
+        cls.btcEth = cls.s.abi_contract('btc-eth.py', endowment=2000*cls.ETHER, sender=tester.k1)
+        assert cls.btcEth.setTrustedBtcRelay(cls.c.address, sender=tester.k1) == 1
+
+        cls.snapshot = cls.s.snapshot()
+        cls.seed = tester.seed
+
+    def setup_method(self, method):
+        self.s.revert(self.snapshot)
+        tester.seed = self.seed
+
+
+    def testRelayTxOutputs(self):
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(self.BLOCK_100K, self.BLOCK_100K_TXS, 1)
+        res = self.c.relayTxOutputs(self.TX_BYTES, txIndex, siblings, txBlockHash, [0, 1], self.btcEth.address,
+            sender=tester.k2, profiling=True)
+        print('GAS: '+str(res['gas']))
+        assert res['output'] == 1
+        assert self.s.block.get_balance(self.ETH_ADDR) == 13
+
+        # the relay can NOT reclaim
+        assert 0 == self.c.relayTxOutputs(self.TX_BYTES, txIndex, siblings, txBlockHash, [0, 1], self.btcEth.address)
+
+    def testOutputsAreForwarded(self):
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(self.BLOCK_100K, self.BLOCK_100K_TXS, 1)
+        # btc-eth only accepts outputs 0 and 1
+        assert 0 == self.c.relayTxOutputs(self.TX_BYTES, txIndex, siblings, txBlockHash, [1], self.btcEth.address)
+        assert self.s.block.get_balance(self.ETH_ADDR) == 0
+
+        # the tx has no output 2, so btc-eth is not called
+        assert 0 == self.c.relayTxOutputs(self.TX_BYTES, txIndex, siblings, txBlockHash, [0, 2], self.btcEth.address)
+        assert self.s.block.get_balance(self.ETH_ADDR) == 0
+
+    def testTxNotInBlock(self):
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(self.BLOCK_100K, self.BLOCK_100K_TXS, 1)
+        txBytes = self.TX_BYTES[:-1] + '\x01'
+        assert 0 == self.c.relayTxOutputs(txBytes, txIndex, siblings, txBlockHash, [0, 1], self.btcEth.address)
+        assert self.s.block.get_balance(self.ETH_ADDR) == 0
+
+    # a script of up to 32 bytes is given whole, and a longer one as its
+    # sha256.  The tx is not in a block, so the relay here accepts any proof
+    def testLongScriptIsHashed(self):
+        relay = self.s.abi_contract(ACCEPT_ALL_RELAY)
+        assert self.c.setTrustedBtcRelay(relay.address) == 1
+        dest = self.s.abi_contract(OUTPUTS_DESTINATION)
+
+        script = '\x6a' * 40
+        txBytes = ('\x01\x00\x00\x00' + '\x01' + '\x11'*32 + '\x00'*4 + '\x00' + '\xff'*4
+            + '\x02' + struct.pack('<Q', 7) + '\x01\x51' + struct.pack('<Q', 8) + chr(len(script)) + script
+            + '\x00'*4)
+        assert self.c.relayTxOutputs(txBytes, 0, [], 0, [0, 1], dest.address) == 1
+        assert [x % 2**256 for x in dest.getOutputs()] == [7, 0x51 * 256**31, 1, 8, int(sha256(script).hexdigest(), 16), len(script)]
+
+    def testVerifyTxBatch(self):
+        proofs = [makeMerkleProof(self.BLOCK_100K, self.BLOCK_100K_TXS, txIndex) for txIndex in [1, 3, 2, 0]]
+
+        # the proof of tx[2] is given a wrong sibling
+        proofs[2][2] = proofs[2][2][:-1] + [proofs[2][2][-1] + 1]
+
+        # a block within 6 confirmations (100001)
+        proofs.append([proofs[0][0], 1, proofs[0][2], 0x00000000000080b66c911bd5ba14a74260057311eaeb1982802f7010f1a9f090])
+
+        txHashes = [p[0] for p in proofs]
+        txIndexes = [p[1] for p in proofs]
+        siblings = [s for p in proofs for s in p[2]]
+        siblingCounts = [len(p[2]) for p in proofs]
+        txBlockHashes = [p[3] for p in proofs]
+
+        res = self.c.verifyTxBatch(txHashes, txIndexes, siblings, siblingCounts, txBlockHashes, profiling=True)
+        print('GAS: '+str(res['gas']))
+        assert res['output'] == 0b01011
+
+        expBits = 0
+        gasSingly = 0
+        for i, [txHash, txIndex, sibling, txBlockHash] in enumerate(proofs):
+            res1 = self.relay.verifyTx(txHash, txIndex, sibling, txBlockHash, profiling=True)
+            expBits += res1['output'] * 2**i
+            gasSingly += res1['gas']
+        assert res['output'] == expBits
+        assert res['gas'] < gasSingly
+
+        # mismatched lengths
+        assert self.c.verifyTxBatch(txHashes, txIndexes[:-1], siblings, siblingCounts, txBlockHashes) == 0
+
+        # a count that would wrap siblingStart back to 0 fails its proof and
+        # the ones after it, instead of them reusing the siblings of tx[1]
+        p = proofs[0]
+        assert self.c.verifyTxBatch([p[0]]*3, [p[1]]*3, p[2], [len(p[2]), -len(p[2]), len(p[2])], [p[3]]*3) == 0b001
+
+    # pre-parsed outputs are much cheaper than relayTx of the tx in hex.
+    # With relayTxBinary, btc-eth reads the binary tx in memory itself, which
+    # costs about the same as this contract doing it
+    def testGas(self):
+        [txHash, txIndex, siblings, txBlockHash] = makeMerkleProof(self.BLOCK_100K, self.BLOCK_100K_TXS, 1)
+        gas = {}
+        for name, relay in [
+                ('hex', lambda: self.relayTxHex(txHash, txIndex, siblings, txBlockHash)),
+                ('binary', lambda: self.c.relayTxBinary(self.TX_BYTES, txIndex, siblings, txBlockHash, self.btcEth.address, profiling=True)),
+                ('outputs', lambda: self.c.relayTxOutputs(self.TX_BYTES, txIndex, siblings, txBlockHash, [0, 1], self.btcEth.address, profiling=True))]:
+            self.s.revert(self.snapshot)
+            res = relay()
+            assert res['output'] == 1
+            gas[name] = res['gas']
+        print('@@@ relay gas: {0}').format(gas)
+        assert gas['outputs'] * 4 < gas['hex'] * 3
+        assert gas['outputs'] < gas['binary'] * 1.05
+
+    # relayTx of TX_BYTES in hex by the relay itself, which btc-eth then trusts
+    def relayTxHex(self, txHash, txIndex, siblings, txBlockHash):
+        assert self.btcEth.setTrustedBtcRelay(self.relay.address, sender=tester.k1) == 1
+        return self.relay.relayTx(self.TX_BYTES.encode('hex'), txHash, txIndex, siblings, txBlockHash, self.btcEth.address, profiling=True)
+
+
+# a relay whose verifyTx() accepts any proof
+ACCEPT_ALL_RELAY = '''
+def verifyTx(txHash, txIndex, sibling:arr, txBlockHash):
+    return(1)
+'''
+
+# a relayTxOutputs() destination that keeps the outputs it is given
+OUTPUTS_DESTINATION = '''
+data outputs[6]
+
+def processOutputs(txHash, outNums:arr, outputs:arr):
+    i = 0
+    while i < 6:
+        self.outputs[i] = outputs[i]
+        i += 1
+    return(1)
+
+def getOutputs():
+    return(load(self.outputs[0], items=6):arr)
+'''
@@ -5,7 +5,7 @@ import struct
 import pytest
 slow = pytest.mark.slow
 
-from utilRelay import dblSha256Flip
+from utilRelay import dblSha256Flip, BLOCK_GAS_LIMIT
 
 class TestBtcRelay(object):
 
@@ -15,7 +15,7 @@ class TestBtcRelay(object):
     ETHER = 10 ** 18
 
     def setup_class(cls):
-        tester.gas_limit = int(2.25e6)
+        tester.gas_limit = BLOCK_GAS_LIMIT
         cls.s = tester.state()
         cls.c = cls.s.abi_contract(cls.CONTRACT, endowment=2000*cls.ETHER)
         cls.snapshot = cls.s.snapshot()
@@ -252,6 +252,77 @@ class TestBtcRelay(object):
             assert res['output'] == exp
 
 
+    # after a reorg to a lower Head, the blocks of the previous chain must
+    # not remain among the recent main chain blocks
+    def testReorgToLowerHead(self):
+        [block99999, lastEasyBlock, block100k] = self.storeReorgToLowerHead(self.c)
+
+        assert self.c.within6Confirms(block100k) == 1
+        assert self.c.within6Confirms(block99999) == 1
+        assert self.c.within6Confirms(lastEasyBlock) == 0
+
+        # blocks 99991 to 100000 have the same difficulty
+        difficulty = 0x00000000FFFF0000000000000000000000000000000000000000000000000000 / (0x04864c * 256**(0x1b - 3))
+        assert self.c.getAverageBlockDifficulty() == 10 * difficulty
+
+
+    # inMainChain() gives the same results with the main chain index
+    def testMainChainIndex(self):
+        indexed = self.s.abi_contract(self.CONTRACT, endowment=2000*self.ETHER)
+        assert indexed.enableMainChainIndex() == 1
+
+        blocks = self.storeReorgToLowerHead(self.c)
+        blocks += self.storeReorgToLowerHead(indexed)
+        assert indexed.enableMainChainIndex() == 0
+
+        for blockHash in blocks + [0, 1]:
+            assert indexed.inMainChain(blockHash) == self.c.inMainChain(blockHash)
+        assert indexed.inMainChain(blocks[0]) == 1
+        assert indexed.inMainChain(blocks[1]) == 0
+        assert indexed.inMainChain(blocks[2]) == 1
+
+        walkGas = self.c.inMainChain(blocks[0], profiling=True)['gas']
+        lookupGas = indexed.inMainChain(blocks[0], profiling=True)['gas']
+        print('@@@ inMainChain gas walk: {0} lookup: {1}').format(walkGas, lookupGas)
+        assert lookupGas < walkGas
+
+
+    # store 11 blocks from 99989, and an easy chain of 11 blocks from 99999
+    # that is then reorganized by block 100000.
+    # returns [block99999, lastEasyBlock, block100k]
+    def storeReorgToLowerHead(self, c):
+        with open('test/headers/bh80_100k.txt') as f:
+            headers = [line[:-1].decode('hex') for line in f][19988:20000]  # 99989 to 100000
+        c.setInitialParent(dblSha256Flip(headers[0]), 99989, 1)
+        for i in range(1, 11):
+            assert c.storeBlockHeader(headers[i]) == 99989 + i
+        block99999 = dblSha256Flip(headers[10])
+
+        # the easy blocks' difficulty is 0 so each has the same score and
+        # becomes the Head
+        hashPrevBlock = block99999
+        for i in range(11):
+            nonce = 0
+            while True:
+                blockHeaderBinary = self.getBlockHeaderBinary(1, hashPrevBlock, 0, 1293623863, 0x207fFFFF, nonce)
+                if dblSha256Flip(blockHeaderBinary) < 0x7fffff * 256**29:
+                    break
+                nonce += 1
+            assert c.storeBlockHeader(blockHeaderBinary) == 100000 + i
+            hashPrevBlock = dblSha256Flip(blockHeaderBinary)
+        assert c.within6Confirms(hashPrevBlock) == 1
+        assert c.within6Confirms(block99999) == 0
+
+        # block 100000 has more difficulty than all of them
+        res = c.storeBlockHeader(headers[11], profiling=True)
+        print('@@@ reorg gas: {0}').format(res['gas'])
+        assert res['output'] == 100000
+        block100k = dblSha256Flip(headers[11])
+        assert c.getBlockchainHead() == block100k
+
+        return [block99999, hashPrevBlock, block100k]
+
+
     def storeGenesisBlock(self):
         self.c.setInitialParent(0, 0, 1)
 
@@ -342,6 +413,19 @@ class TestBtcRelay(object):
 
         assert self.c.storeBlockHeader(bhBinary) == 300000
 
+    # only hashPrevBlock and hashMerkleRoot are stored, but a caller can
+    # get a whole header checked against the stored blocks
+    def testGetBlockHeader(self):
+        block300K = 0x000000000000000008360c20a2ceff91cc8c4f357932377f48659b37bb86c759
+        self.c.setInitialParent(block300K, 299999, 1)
+        bhBinary = '0200000059c786bb379b65487f373279354f8ccc91ffcea2200c36080000000000000000dd9d7757a736fec629ab0ed0f602ba23c77afe7edec85a7026f641fd90bcf8f658ca8154747b1b1894fc742f'.decode('hex')
+
+        assert self.c.getBlockHeader(bhBinary) == ''
+        assert self.c.storeBlockHeader(bhBinary) == 300000
+        assert self.c.getBlockHeader(bhBinary) == bhBinary
+        assert self.c.getBlockHeader(bhBinary[:-1] + '\x00') == ''
+        assert self.c.getBlockHeader(bhBinary[:-1]) == ''
+
     # was converted to macro
     # def testFastHashBlock(self):
     #     blockHeaderStr = "0100000050120119172a610421a6c3011dd330d9df07b63616c2cc1f1cd00200000000006657a9252aacd5c0b2940996ecff952228c3067cc38d4885efb5a4ac4247e9f337221b4d4c86041b0f2b5710"
@@ -365,6 +449,19 @@ class TestBtcRelay(object):
         wrappedMerkle = res['output'] % 2**256
         assert wrappedMerkle == expMerkle
 
+    # macros, which are wrapped by btcrelay_test.py
+    def testMacros(self):
+        c = self.s.abi_contract('btcrelay_test.py')
+        assert c.testTargetFromBits() == 1
+        assert c.testConcatHash() == 1
+        assert c.testFlip32Bytes() == 1
+
+    # only the relay itself sets the Head with setHeaviest()
+    def testSetHeaviestOnlySelf(self):
+        assert self.c.setInitialParent(0, 0, 1) == 1
+        assert self.c.setHeaviest(1) == 0
+        assert self.c.getBlockchainHead() == 0
+
     def testsetInitialParentOnlyOnce(self):
         assert self.c.setInitialParent(0, 0, 1) == 1
         assert self.c.setInitialParent(0, 0, 1) == 0
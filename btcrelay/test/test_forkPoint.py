@@ -0,0 +1,48 @@
+import sys
+sys.path.append('script')
+
+from forkPoint import findForkPoint
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestForkPoint(object):
+
+    # main chain hashes are 'm<height>'; the contract has them from
+    # 'initialHeight' (its initial parent) up to 'forkHeight' and then
+    # its own branch
+    def contract(self, forkHeight, calls, initialHeight=0):
+        def inContractMainChain(blockHash):
+            calls.append(blockHash)
+            return initialHeight <= int(blockHash[1:]) <= forkHeight
+        return inContractMainChain
+
+    def realHashAt(self, height):
+        return 'm{0}'.format(height)
+
+    def testForkPoint(self):
+        for depth in range(11):
+            calls = []
+            forkHeight = 1000 - depth
+            assert findForkPoint(1000, self.realHashAt, self.contract(forkHeight, calls), 10) == forkHeight
+            # one call for the lowest height and a binary search of 10
+            assert len(calls) <= 5
+
+    def testTooDeep(self):
+        assert findForkPoint(1000, self.realHashAt, self.contract(989, []), 10) is None
+
+    # a young relay, whose initial parent is fewer than maxDepth blocks
+    # below its Head
+    def testYoungContract(self):
+        for initialHeight in [995, 999]:
+            for forkHeight in range(initialHeight, 1000):
+                calls = []
+                contract = self.contract(forkHeight, calls, initialHeight=initialHeight)
+                assert findForkPoint(1000, self.realHashAt, contract, 10) == forkHeight
+                # a walk up to the initial parent, then a binary search
+                # above it
+                assert len(calls) <= 1 + (initialHeight - 990) + 3
+
+        # the initial parent itself was orphaned
+        assert findForkPoint(1000, self.realHashAt, self.contract(994, [], initialHeight=995), 10) is None
@@ -0,0 +1,26 @@
+import json
+
+from gasBenchmark import run, regressions, BASELINE
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestGasBenchmark(object):
+
+    def testRegressions(self):
+        baseline = {'a': {'gas': 1000}, 'b': {'gas': 1000}, 'c': {'gas': 1000}}
+        results = {'a': {'gas': 1010}, 'b': {'gas': 1011}, 'c': {'gas': 900}, 'new': {'gas': 5}}
+        assert regressions(results, baseline, threshold=0.01) == [['b', 1000, 1011]]
+        assert regressions(results, baseline, threshold=0.02) == []
+
+    def testQuickScenarios(self):
+        results = run(['store1', 'within6Confirms'])
+        assert results.keys() == ['store1', 'within6Confirms']
+        assert results['store1']['gas'] > results['within6Confirms']['gas'] > 21000
+
+    @slow
+    def testNoGasRegression(self):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        assert regressions(run(), baseline) == []
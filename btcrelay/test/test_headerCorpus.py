@@ -0,0 +1,66 @@
+import sys
+sys.path.append('script')
+
+import shutil
+import tempfile
+
+from headerCorpus import HeaderCorpus, convertText, heightFromFilename
+from btcHeader import hashHeader
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestHeaderCorpus(object):
+
+    TEXT = "test/headers/500from300k.txt"
+    START_HEIGHT = 300000
+
+    def setup_class(cls):
+        cls.tmpDir = tempfile.mkdtemp()
+        cls.path = cls.tmpDir + '/500from300k.bhc'
+        cls.count = convertText([cls.TEXT], cls.path)
+        cls.corpus = HeaderCorpus(cls.path)
+        with open(cls.TEXT) as f:
+            cls.headers = [line.strip().decode('hex') for line in f]
+
+    def teardown_class(cls):
+        cls.corpus.close()
+        shutil.rmtree(cls.tmpDir)
+
+    def testConvert(self):
+        assert self.count == len(self.headers) == 500
+        assert self.corpus.startHeight == self.START_HEIGHT
+        assert self.corpus.endHeight == self.START_HEIGHT + 499
+        assert str(self.corpus.headers(self.START_HEIGHT, self.corpus.endHeight)) == ''.join(self.headers)
+
+    def testSlice(self):
+        assert str(self.corpus.header(self.START_HEIGHT)) == self.headers[0]
+        assert hashHeader(self.corpus.header(self.START_HEIGHT)) == '000000000000000082ccf8f1557c5d40b21edabb18d2d691cfbf87118bac7254'
+        view = self.corpus.headers(self.START_HEIGHT+100, self.START_HEIGHT+104)
+        assert isinstance(view, buffer)
+        assert str(view) == ''.join(self.headers[100:105])
+
+        with pytest.raises(IndexError):
+            self.corpus.headers(self.START_HEIGHT-1, self.START_HEIGHT+5)
+        with pytest.raises(IndexError):
+            self.corpus.header(self.START_HEIGHT+500)
+
+    def testHeightOf(self):
+        for i in [0, 1, 250, 499]:
+            assert self.corpus.heightOf(hashHeader(self.headers[i])) == self.START_HEIGHT + i
+        assert self.corpus.heightOf('00'*32) is None
+        assert self.corpus.heightOf('ff'*32) is None
+
+    def testConvertRejectsGap(self):
+        with pytest.raises(ValueError):
+            convertText(["test/headers/500from300k.txt", "test/headers/bh170001.txt"],
+                self.tmpDir + '/gap.bhc')
+
+    def testHeightFromFilename(self):
+        assert heightFromFilename("test/headers/bh170001.txt") == 170001
+        assert heightFromFilename("test/headers/bh150_170k.txt") == 150001
+        assert heightFromFilename("test/headers/bh80_100k.txt") == 80001
+        assert heightFromFilename("test/headers/100from300k.txt") == 300000
+        with pytest.raises(ValueError):
+            heightFromFilename("headers.txt")
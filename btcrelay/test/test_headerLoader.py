@@ -0,0 +1,105 @@
+import sys
+sys.path.append('script')
+
+import shutil
+import tempfile
+
+from headerCorpus import HeaderCorpus, convertText
+from headerLoader import LoadStats, corpusChunks, resumeHeight, load
+from btcHeader import hashHeaderInt
+
+import pytest
+slow = pytest.mark.slow
+
+
+# stands in for the relay contract and the submitter: the Head moves to the
+# last header of each chunk, and submit() raises after 'crashAfter' chunks.
+# With 'stuck', chunks are taken but the Head does not move
+class FakeRelay(object):
+
+    def __init__(self, head, crashAfter=None, stuck=False):
+        self.head = head
+        self.crashAfter = crashAfter
+        self.stuck = stuck
+        self.chunks = []
+
+    def getHead(self):
+        return self.head
+
+    def submit(self, chunks):
+        for [bhBinary, count] in chunks:
+            if self.crashAfter is not None and len(self.chunks) == self.crashAfter:
+                self.crashAfter = None
+                raise IOError('node went away')
+            self.chunks.append([bhBinary, count])
+            if not self.stuck:
+                self.head = hashHeaderInt(bhBinary[-80:])
+
+
+class TestHeaderLoader(object):
+
+    TEXT = "test/headers/500from300k.txt"
+    START_HEIGHT = 300000
+
+    def setup_class(cls):
+        cls.tmpDir = tempfile.mkdtemp()
+        cls.path = cls.tmpDir + '/500from300k.bhc'
+        convertText([cls.TEXT], cls.path)
+        cls.corpus = HeaderCorpus(cls.path)
+
+    def teardown_class(cls):
+        cls.corpus.close()
+        shutil.rmtree(cls.tmpDir)
+
+    def hashAt(self, height):
+        return hashHeaderInt(str(self.corpus.header(height)))
+
+    def testCorpusChunks(self):
+        chunks = list(corpusChunks(self.corpus, 300010, 300021, 5))
+        assert [c[1] for c in chunks] == [5, 5, 2]
+        assert ''.join(c[0] for c in chunks) == str(self.corpus.headers(300010, 300021))
+
+    def testResumeHeight(self):
+        assert resumeHeight(self.corpus, self.hashAt(300123)) == 300123
+        with pytest.raises(ValueError):
+            resumeHeight(self.corpus, 0)
+
+    def testLoad(self):
+        relay = FakeRelay(self.hashAt(300100))
+        stats = LoadStats()
+        assert load(self.corpus, relay, relay.getHead, 7, endHeight=300150, stats=stats) == 300150
+        assert relay.head == self.hashAt(300150)
+        assert ''.join(c[0] for c in relay.chunks) == str(self.corpus.headers(300101, 300150))
+
+        # nothing is sent when the Head is already at the end
+        assert load(self.corpus, relay, relay.getHead, 7, endHeight=300150) == 300150
+        assert len(relay.chunks) == 8
+
+    def testResumeAfterCrash(self):
+        relay = FakeRelay(self.hashAt(300000), crashAfter=3)
+        assert load(self.corpus, relay, relay.getHead, 10, endHeight=300100) == 300100
+
+        # the 3 chunks stored before the crash are not sent again
+        assert [c[1] for c in relay.chunks] == [10]*10
+        assert ''.join(c[0] for c in relay.chunks) == str(self.corpus.headers(300001, 300100))
+
+    def testGiveUp(self):
+        relay = FakeRelay(self.hashAt(300000), crashAfter=0)
+        with pytest.raises(IOError):
+            load(self.corpus, relay, relay.getHead, 10, maxRestarts=0)
+
+    # a submit() that stores nothing is retried like one that raises
+    def testGiveUpWithoutProgress(self):
+        relay = FakeRelay(self.hashAt(300000), stuck=True)
+        with pytest.raises(Exception):
+            load(self.corpus, relay, relay.getHead, 10, endHeight=300020, maxRestarts=2)
+        assert len(relay.chunks) == 3*2
+
+    def testStats(self):
+        now = [100.0]
+        stats = LoadStats(clock=lambda: now[0])
+        stats.record(821000, 5)
+        stats.record(821000, 5)
+        now[0] += 4
+        assert stats.headersPerSec() == 2.5
+        assert stats.gasPerSec() == 410500
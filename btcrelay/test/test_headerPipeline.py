@@ -0,0 +1,131 @@
+from ethereum import tester
+
+import sys
+sys.path.append('script')
+
+from headerPipeline import makeChunks, prefetchHeaders, PipelinedSubmitter
+from chunkSizer import ChunkSizer, TX_BASE_GAS, estimateWithTester
+
+import pytest
+slow = pytest.mark.slow
+
+
+# stands in for the Ethereum node: transactions are "mined" when their
+# receipt is first requested, chunks in 'failChunks' use all their gas, and
+# the transactions in 'unmined' are never mined
+class FakeSubmitter(PipelinedSubmitter):
+
+    def __init__(self, failChunks=None, unmined=None, **kwargs):
+        self.instance = self
+        self.address = '0x1'
+        self.nonce = 0
+        self.failChunks = failChunks or {}
+        self.unmined = unmined or set()
+        self.sent = []
+        self.maxPending = 0
+        self.pending = set()
+        PipelinedSubmitter.__init__(self, self, 'c0ffee', pollInterval=0, **kwargs)
+
+    def transaction_count(self, defaultBlock='latest'):
+        return self.nonce
+
+    # a nonce below the next one replaces a pending transaction
+    def sendChunk(self, bhBinary, count, nonce, gas, gasPrice=None):
+        assert nonce <= self.nonce
+        if nonce == self.nonce:
+            self.nonce += 1
+        txHash = len(self.sent)
+        self.sent.append([bhBinary, count, nonce, gas, gasPrice or self.gasPrice])
+        self.pending.add(txHash)
+        self.maxPending = max(self.maxPending, len(self.pending))
+        return txHash
+
+    def getReceipt(self, txHash):
+        if txHash in self.unmined:
+            return None
+        self.pending.discard(txHash)
+        [bhBinary, count, nonce, gas, gasPrice] = self.sent[txHash]
+        gasUsed = TX_BASE_GAS + count * 100000
+        if self.failChunks.get(bhBinary, 0) > 0:
+            self.failChunks[bhBinary] -= 1
+            gasUsed = gas
+        return {'gasUsed': hex(gasUsed)}
+
+
+class TestHeaderPipeline(object):
+
+    def testMakeChunks(self):
+        headers = [chr(i)*80 for i in range(7)]
+        chunks = list(makeChunks(headers, 3))
+        assert [c[1] for c in chunks] == [3, 3, 1]
+        assert ''.join(c[0] for c in chunks) == ''.join(headers)
+
+    def testPrefetchInOrder(self):
+        headers = list(prefetchHeaders(lambda h: str(h), 10, 40, numThreads=4))
+        assert headers == [str(h) for h in range(10, 41)]
+
+    def testNoncesAndInFlight(self):
+        chunks = [[str(i), 5] for i in range(10)]
+        sub = FakeSubmitter(maxInFlight=4)
+        assert sub.submit(chunks) == 10
+        assert [s[2] for s in sub.sent] == range(10)
+        assert sub.maxPending == 4
+
+    def testResubmitFromFirstFailed(self):
+        chunks = [[str(i), 5] for i in range(6)]
+        sub = FakeSubmitter(failChunks={'2': 1}, maxInFlight=3)
+        assert sub.submit(chunks) == 6
+
+        # chunks 0,1,2 are sent; 2 fails so nothing more is sent until
+        # the pending ones are done, then chunk 2 onwards is resubmitted
+        assert [s[0] for s in sub.sent] == ['0', '1', '2', '2', '3', '4', '5']
+        assert [s[2] for s in sub.sent] == range(7)
+
+    def testGiveUp(self):
+        chunks = [[str(i), 5] for i in range(3)]
+        sub = FakeSubmitter(failChunks={'1': 99}, maxInFlight=2, maxRetries=2)
+        with pytest.raises(Exception):
+            sub.submit(chunks)
+
+    def testReplaceUnmined(self):
+        chunks = [[str(i), 5] for i in range(3)]
+        sub = FakeSubmitter(unmined={0, 3}, maxInFlight=3, receiptTimeout=0)
+        assert sub.submit(chunks) == 3
+
+        # chunk 0 is sent again twice with its nonce and a higher gasPrice
+        assert [s[0] for s in sub.sent] == ['0', '1', '2', '0', '0']
+        assert [s[2] for s in sub.sent] == [0, 1, 2, 0, 0]
+        gasPrice = sub.gasPrice
+        assert [s[4] for s in sub.sent] == [gasPrice, gasPrice, gasPrice,
+            int(gasPrice * 1.125), int(int(gasPrice * 1.125) * 1.125)]
+
+    def testGiveUpUnmined(self):
+        chunks = [[str(i), 5] for i in range(2)]
+        sub = FakeSubmitter(unmined=set(range(10)), maxInFlight=1,
+            receiptTimeout=0, maxRetries=2)
+        with pytest.raises(Exception):
+            sub.submit(chunks)
+        assert [s[2] for s in sub.sent] == [0, 0, 0]
+
+    def testSizerGas(self):
+        sizer = ChunkSizer(gasPerHeader=200000, margin=1.5)
+        chunks = [[str(i), 5] for i in range(4)]
+        sub = FakeSubmitter(sizer=sizer, maxInFlight=1)
+        sub.submit(chunks)
+
+        # first chunk uses the initial estimate, the rest what was measured
+        assert sub.sent[0][3] == TX_BASE_GAS + 5*300000
+        assert sub.sent[1][3] == TX_BASE_GAS + 5*150000
+        assert sizer.chunkSize(TX_BASE_GAS + 33*150000) == 33
+
+    def testEstimateWithTester(self):
+        block300kPrev = 0x000000000000000067ecc744b5ae34eebbde14d21ca4db51652e4d67e155f07e
+        with open("test/headers/100from300k.txt") as f:
+            headerBins = ''.join(f.readline()[:-1] for i in range(5)).decode('hex')
+
+        gasLimit = tester.gas_limit
+        gas = estimateWithTester(headerBins, 5, block300kPrev, 299999)
+        assert tester.gas_limit == gasLimit
+        sizer = ChunkSizer()
+        sizer.record(gas, 5)
+        assert 100000 < sizer.gasPerHeader() < 200000
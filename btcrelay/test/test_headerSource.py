@@ -0,0 +1,174 @@
+import sys
+sys.path.append('script')
+
+import json
+import shutil
+import tempfile
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from headerSource import BitcoindSource, CorpusSource, makeSource, iterHeaders
+from headerCorpus import convertText
+from btcHeader import hashHeader
+
+import pytest
+slow = pytest.mark.slow
+
+
+START_HEIGHT = 300000
+
+
+# stands in for bitcoind's JSON-RPC, serving the headers from 500from300k.txt,
+# or rejecting every batch with the error 'batchError' if it is set
+class FakeBitcoind(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        if self.headers.get('Authorization') != 'Basic dXNlcjpwdw==':  # user:pw
+            self.send_response(401)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        calls = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server.batches.append([c['method'] for c in calls])
+        if server.batchError:
+            self._reply({'id': None, 'result': None, 'error': server.batchError})
+            return
+
+        responses = []
+        for c in calls:
+            result, error = None, None
+            if c['method'] == 'getblockhash':
+                i = c['params'][0] - START_HEIGHT
+                if 0 <= i < len(server.bitcoindHeaders):
+                    result = hashHeader(server.bitcoindHeaders[i])
+                else:
+                    error = {'code': -8, 'message': 'Block height out of range'}
+            elif c['method'] == 'getblockheader':
+                result = server.byHash[c['params'][0]].encode('hex')
+            elif c['method'] == 'getblockcount':
+                result = START_HEIGHT + len(server.bitcoindHeaders) - 1
+            responses.append({'id': c['id'], 'result': result, 'error': error})
+        self._reply(responses)
+
+    def _reply(self, responses):
+        body = json.dumps(responses)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+
+# kept-alive connections would otherwise block each other
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestHeaderSource(object):
+
+    def setup_class(cls):
+        with open("test/headers/500from300k.txt") as f:
+            cls.headers = [line.strip().decode('hex') for line in f]
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBitcoind)
+        cls.server.bitcoindHeaders = cls.headers
+        cls.server.byHash = dict((hashHeader(h), h) for h in cls.headers)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.url = 'http://user:pw@127.0.0.1:{0}'.format(cls.server.server_address[1])
+
+    def teardown_class(cls):
+        cls.server.shutdown()
+
+    def setup_method(self, method):
+        self.server.batches = []
+        self.server.connections = 0
+        self.server.batchError = None
+
+    def testBitcoindBatches(self):
+        source = BitcoindSource(self.url, batchSize=100)
+        assert source.headers(START_HEIGHT + 10, START_HEIGHT + 259) == self.headers[10:260]
+
+        # 3 batches of getblockhash then getblockheader, over 1 connection
+        assert [len(b) for b in self.server.batches] == [100, 100, 100, 100, 50, 50]
+        assert self.server.batches[0][0] == 'getblockhash'
+        assert self.server.batches[1][0] == 'getblockheader'
+        assert self.server.connections == 1
+
+        assert source.tipHeight() == START_HEIGHT + 499
+        assert source.hashAt(START_HEIGHT) == '000000000000000082ccf8f1557c5d40b21edabb18d2d691cfbf87118bac7254'
+        assert self.server.connections == 1
+        source.close()
+
+    def testBitcoindErrors(self):
+        source = BitcoindSource(self.url)
+        with pytest.raises(Exception) as e:
+            source.headers(START_HEIGHT + 495, START_HEIGHT + 505)
+        assert 'out of range' in str(e.value)
+        source.close()
+
+        source = BitcoindSource(self.url.replace('pw@', 'wrong@'))
+        with pytest.raises(Exception) as e:
+            source.tipHeight()
+        assert '401' in str(e.value)
+
+    def testBitcoindBatchRejected(self):
+        self.server.batchError = {'code': -32700, 'message': 'Parse error'}
+        source = BitcoindSource(self.url)
+        with pytest.raises(Exception) as e:
+            source.tipHeight()
+        assert 'Parse error' in str(e.value)
+        source.close()
+
+    def testReconnect(self):
+        source = BitcoindSource(self.url)
+        assert source.hashAt(START_HEIGHT + 1) == hashHeader(self.headers[1])
+        source.conn.sock.close()
+        assert source.hashAt(START_HEIGHT + 2) == hashHeader(self.headers[2])
+        assert self.server.connections == 2
+        source.close()
+
+    def testCorpus(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            convertText(["test/headers/500from300k.txt"], tmpDir + '/c.bhc')
+            source = makeSource('corpus:' + tmpDir + '/c.bhc')
+            assert isinstance(source, CorpusSource)
+            assert source.headers(START_HEIGHT + 3, START_HEIGHT + 7) == self.headers[3:8]
+            assert source.hashAt(START_HEIGHT + 499) == hashHeader(self.headers[499])
+            assert source.tipHeight() == START_HEIGHT + 499
+            source.corpus.close()
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def testMakeSource(self):
+        source = makeSource('bitcoind:' + self.url, batchSize=7)
+        assert source.batchSize == 7
+        assert source.port == self.server.server_address[1]
+        with pytest.raises(ValueError):
+            makeSource('electrum')
+
+    def testIterHeaders(self):
+        ranges = []
+        def fetchRange(start, end):
+            ranges.append([start, end])
+            return self.headers[start-START_HEIGHT:end-START_HEIGHT+1]
+
+        headers = list(iterHeaders(fetchRange, START_HEIGHT, START_HEIGHT + 24, 10))
+        assert headers == self.headers[:25]
+        assert ranges == [[START_HEIGHT, START_HEIGHT+9], [START_HEIGHT+10, START_HEIGHT+19],
+            [START_HEIGHT+20, START_HEIGHT+24]]
+        assert list(iterHeaders(fetchRange, START_HEIGHT, START_HEIGHT - 1, 10)) == []
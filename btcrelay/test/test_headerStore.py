@@ -0,0 +1,98 @@
+import sys
+sys.path.append('script')
+
+from headerStore import HeaderStore
+from btcHeader import hashHeader, difficultyFromBits, bitsOf
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestHeaderStore(object):
+
+    START_HEIGHT = 300000
+
+    def setup_class(cls):
+        with open("test/headers/500from300k.txt") as f:
+            cls.headers = [f.readline()[:-1].decode('hex') for i in range(20)]
+
+    def setup_method(self, method):
+        self.store = HeaderStore(':memory:')
+        self.fetched = []
+
+    def teardown_method(self, method):
+        self.store.close()
+
+    def fetchHeaders(self, startHeight, endHeight):
+        self.fetched.extend(range(startHeight, endHeight+1))
+        return self.headers[startHeight-self.START_HEIGHT:endHeight-self.START_HEIGHT+1]
+
+    def testPutAndGet(self):
+        for i in range(10):
+            self.store.put(self.START_HEIGHT+i, self.headers[i])
+
+        assert self.store.tipHeight() == self.START_HEIGHT + 9
+        assert self.store.hashAt(self.START_HEIGHT) == '000000000000000082ccf8f1557c5d40b21edabb18d2d691cfbf87118bac7254'
+        assert self.store.getByHeight(self.START_HEIGHT+3) == self.headers[3]
+        assert self.store.headers(self.START_HEIGHT+2, self.START_HEIGHT+5) == ''.join(self.headers[2:6])
+        assert self.store.headers(self.START_HEIGHT+8, self.START_HEIGHT+10) is None
+
+        [height, raw, cumulWork, mainChain] = self.store.getByHash(hashHeader(self.headers[4]))
+        assert height == self.START_HEIGHT + 4
+        assert raw == self.headers[4]
+        assert cumulWork is None  # first header's work was never set
+        assert mainChain
+
+    def testCumulWork(self):
+        self.store.put(self.START_HEIGHT, self.headers[0])
+        self.store.setCumulWork(hashHeader(self.headers[0]), 1)
+        for i in range(1, 5):
+            self.store.put(self.START_HEIGHT+i, self.headers[i])
+
+        expWork = 1 + sum(difficultyFromBits(bitsOf(h)) for h in self.headers[1:5])
+        assert self.store.getByHash(hashHeader(self.headers[4]))[2] == expWork
+
+        # re-putting the first header doesn't lose its work
+        self.store.put(self.START_HEIGHT, self.headers[0])
+        assert self.store.getByHash(hashHeader(self.headers[0]))[2] == 1
+
+    def workAt(self, i):
+        return self.store.getByHash(hashHeader(self.headers[i]))[2]
+
+    def testSyncSeedsWork(self):
+        self.store.sync(self.fetchHeaders, self.START_HEIGHT+5, startHeight=self.START_HEIGHT, startWork=1)
+        assert self.workAt(0) == 1
+        assert self.workAt(5) == 1 + sum(difficultyFromBits(bitsOf(h)) for h in self.headers[1:6])
+
+        self.store.sync(self.fetchHeaders, self.START_HEIGHT+9)
+        assert self.workAt(9) == 1 + sum(difficultyFromBits(bitsOf(h)) for h in self.headers[1:10])
+
+    def testSyncOnlyFetchesFromTip(self):
+        assert self.store.sync(self.fetchHeaders, self.START_HEIGHT+9, startHeight=self.START_HEIGHT) == 10
+        self.fetched = []
+        assert self.store.sync(self.fetchHeaders, self.START_HEIGHT+15) == 7
+        assert self.fetched == range(self.START_HEIGHT+9, self.START_HEIGHT+16)
+        assert self.store.headers(self.START_HEIGHT, self.START_HEIGHT+15) == ''.join(self.headers[:16])
+
+    def testSyncReorg(self):
+        self.store.sync(self.fetchHeaders, self.START_HEIGHT+5, startHeight=self.START_HEIGHT, startWork=1)
+
+        # an orphaned branch of 2 blocks was stored as the main chain
+        orphan6 = self.headers[6][:-1] + 'x'
+        orphan7 = self.headers[7][:-1] + 'y'
+        self.store.put(self.START_HEIGHT+6, orphan6)
+        self.store.put(self.START_HEIGHT+7, orphan7)
+
+        self.fetched = []
+        self.store.sync(self.fetchHeaders, self.START_HEIGHT+9)
+        assert self.fetched == range(self.START_HEIGHT+7, self.START_HEIGHT+10) + [self.START_HEIGHT+6]
+        assert self.store.headers(self.START_HEIGHT, self.START_HEIGHT+9) == ''.join(self.headers[:10])
+        assert self.store.getByHash(hashHeader(orphan6))[3] == False
+
+        # the headers above the fork were first stored on top of the orphans
+        assert self.workAt(9) == 1 + sum(difficultyFromBits(bitsOf(h)) for h in self.headers[1:10])
+
+    def testSyncShorterChain(self):
+        self.store.sync(self.fetchHeaders, self.START_HEIGHT+9, startHeight=self.START_HEIGHT)
+        self.store.sync(self.fetchHeaders, self.START_HEIGHT+5)
+        assert self.store.tipHeight() == self.START_HEIGHT + 5
@@ -0,0 +1,80 @@
+from ethereum import tester
+
+import sys
+sys.path.append('script')
+
+from headerValidator import validateHeaders, validateChunks, hashHeaders, InvalidHeader
+from headerPipeline import makeChunks
+from btcHeader import hashHeaderInt, difficultyFromBits, bitsOf
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestHeaderValidator(object):
+
+    BLOCK_300K_PREV = 0x000000000000000067ecc744b5ae34eebbde14d21ca4db51652e4d67e155f07e
+
+    def setup_class(cls):
+        with open("test/headers/500from300k.txt") as f:
+            cls.headers = [line.strip().decode('hex') for line in f]
+
+    def testScores(self):
+        scores = validateHeaders(''.join(self.headers[:10]), self.BLOCK_300K_PREV, prevScore=1)
+        assert len(scores) == 10
+        assert scores[0] == 1 + difficultyFromBits(bitsOf(self.headers[0]))
+        assert scores[-1] == 1 + sum(difficultyFromBits(bitsOf(h)) for h in self.headers[:10])
+
+    def testScoresMatchContract(self):
+        gasLimit = tester.gas_limit
+        tester.gas_limit = 10**7
+        s = tester.state()
+        c = s.abi_contract('btcBulkStoreHeaders.py')
+        tester.gas_limit = gasLimit
+        c.setInitialParent(self.BLOCK_300K_PREV, 299999, 1)
+        assert c.bulkStoreHeader(''.join(self.headers[:5]), 5) == 300004
+
+        scores = validateHeaders(''.join(self.headers[:5]), self.BLOCK_300K_PREV, prevScore=1)
+        assert c.getCumulativeDifficulty() == scores[-1]
+
+    def testBadLink(self):
+        with pytest.raises(InvalidHeader) as e:
+            validateHeaders(''.join(self.headers[:3]) + self.headers[4], self.BLOCK_300K_PREV)
+        assert e.value.index == 3
+
+        with pytest.raises(InvalidHeader) as e:
+            validateHeaders(''.join(self.headers[:3]), self.BLOCK_300K_PREV + 1)
+        assert e.value.index == 0
+
+    def testBadPoW(self):
+        # changing the nonce makes the hash (almost certainly) above the target
+        bad = self.headers[2][:-1] + chr((ord(self.headers[2][-1]) + 1) % 256)
+        with pytest.raises(InvalidHeader) as e:
+            validateHeaders(''.join(self.headers[:2]) + bad, self.BLOCK_300K_PREV)
+        assert e.value.index == 2
+        assert 'target' in e.value.reason
+
+        with pytest.raises(InvalidHeader):
+            validateHeaders(''.join(self.headers[:2])[:-1], self.BLOCK_300K_PREV)
+
+    def testValidateChunks(self):
+        chunks = validateChunks(makeChunks(self.headers[:12], 5), self.BLOCK_300K_PREV)
+        assert [c[1] for c in chunks] == [5, 5, 2]
+
+        headers = self.headers[:5] + self.headers[6:12]
+        chunks = validateChunks(makeChunks(headers, 5), self.BLOCK_300K_PREV)
+        assert chunks.next()[1] == 5
+        with pytest.raises(InvalidHeader):
+            chunks.next()
+
+    @slow
+    def testMultiprocess(self):
+        with open("test/headers/bh170001.txt") as f:
+            headersBinary = ''.join(line.strip().decode('hex') for line in f)
+
+        hashes = hashHeaders(headersBinary, numProcesses=3)
+        assert hashes == hashHeaders(headersBinary)
+        assert hashes[-1] == hashHeaderInt(headersBinary[-80:])
+
+        prevHash = int(headersBinary[4:36][::-1].encode('hex'), 16)
+        assert len(validateHeaders(headersBinary, prevHash, numProcesses=3)) == 5000
@@ -0,0 +1,67 @@
+from ethereum import tester
+
+import sys
+sys.path.append('script')
+
+from bitcoin import mk_merkle_proof, bin_sha256
+
+from merkleTree import MerkleTree, buildTrees
+from utilRelay import BLOCK_GAS_LIMIT
+
+import pytest
+slow = pytest.mark.slow
+
+
+class TestMerkleTree(object):
+
+    # block 100000
+    BLOCK_HASH = 0x000000000003ba27aa200b1cecaad478d2b00432346c3f1f3986da1afd33e506
+    MERKLE_ROOT = 0xf3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766
+    HASHES = [u'8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87', u'fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4', u'6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4', u'e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d']
+
+    def fakeHashes(self, numTx):
+        return [bin_sha256(str(i))[::-1].encode('hex') for i in range(numTx)]
+
+    def testBlock100K(self):
+        tree = MerkleTree.fromHexHashes(self.HASHES, self.BLOCK_HASH)
+        assert tree.root() == self.MERKLE_ROOT
+
+        [txHash, txIndex, siblings, txBlockHash] = tree.proof(1)
+        assert txHash == int(self.HASHES[1], 16)
+        assert txIndex == 1
+        assert len(siblings) == 2
+        assert txBlockHash == self.BLOCK_HASH
+
+    def testSameAsPybitcointools(self):
+        for numTx in [1, 2, 3, 5, 8, 11, 17]:
+            hashes = self.fakeHashes(numTx)
+            tree = MerkleTree.fromHexHashes(hashes, 1)
+            header = {'hash': '01', 'merkle_root': format(tree.root(), '064x')}
+            for txIndex in range(numTx):
+                proof = mk_merkle_proof(header, hashes, txIndex)  # asserts the root
+                assert tree.proof(txIndex)[2] == [int(s, 16) for s in proof['siblings']]
+
+    def testProofs(self):
+        tree = MerkleTree.fromHexHashes(self.fakeHashes(6))
+        assert [p[1] for p in tree.proofs([5, 0, 3])] == [5, 0, 3]
+        with pytest.raises(IndexError):
+            tree.proof(6)
+        with pytest.raises(ValueError):
+            MerkleTree('')
+
+    def testBuildTrees(self):
+        blocks = [[''.join(h.decode('hex')[::-1] for h in self.fakeHashes(n)), n] for n in [1, 4, 7, 300]]
+        trees = buildTrees(blocks, numProcesses=2)
+        assert [t.blockHash for t in trees] == [1, 4, 7, 300]
+        assert [t.root() for t in trees] == [MerkleTree(txids).root() for [txids, n] in blocks]
+
+    def testContractComputeMerkle(self):
+        gasLimit = tester.gas_limit
+        tester.gas_limit = BLOCK_GAS_LIMIT
+        s = tester.state()
+        c = s.abi_contract('btcrelay.py')
+        tester.gas_limit = gasLimit
+        tree = MerkleTree.fromHexHashes(self.fakeHashes(13))
+        for txIndex in [0, 6, 12]:
+            [txHash, txIndex, siblings, txBlockHash] = tree.proof(txIndex)
+            assert c.computeMerkle(txHash, txIndex, siblings) % 2**256 == tree.root()
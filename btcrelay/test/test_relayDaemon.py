@@ -0,0 +1,179 @@
+import sys
+sys.path.append('script')
+
+import shutil
+import tempfile
+from threading import Event
+from time import sleep, time
+
+from headerCorpus import HeaderCorpus, convertText
+from headerPipeline import PipelinedSubmitter
+from relayDaemon import RelayDaemon
+from btcHeader import hashHeader, prevHashOf
+
+import pytest
+slow = pytest.mark.slow
+
+
+# source whose tip can be moved, serving headers from a corpus
+class FakeSource(object):
+
+    def __init__(self, corpus, tipHeight):
+        self.corpus = corpus
+        self.tip = tipHeight
+        self.numFetched = 0
+
+    def headers(self, startHeight, endHeight):
+        self.numFetched += endHeight - startHeight + 1
+        view = self.corpus.headers(startHeight, endHeight)
+        return [str(view[i:i+80]) for i in xrange(0, len(view), 80)]
+
+    def hashAt(self, height):
+        return hashHeader(self.corpus.header(height))
+
+    def tipHeight(self):
+        return self.tip
+
+
+# stands in for the Ethereum node and the relay contract: a chunk is
+# "mined" when its receipt is requested, and only if it links to the Head.
+# Receipts are held back while 'mining' is clear, and 'failNonces' use
+# all their gas
+class FakeNode(PipelinedSubmitter):
+
+    def __init__(self, corpus, height, failNonces=(), **kwargs):
+        PipelinedSubmitter.__init__(self, self, 'c0ffee', **kwargs)
+        self.address = '0x1'
+        self.corpus = corpus
+        self.height = height
+        self.failNonces = set(failNonces)
+        self.txs = []
+        self.mining = Event()
+        self.mining.set()
+
+    def transaction_count(self, defaultBlock='latest'):
+        return len(self.txs)
+
+    def sendChunk(self, bhBinary, count, nonce, gas):
+        assert nonce == len(self.txs)
+        self.txs.append([bhBinary, count, gas, None])
+        return nonce
+
+    def getReceipt(self, txHash):
+        if not self.mining.is_set():
+            return None
+        tx = self.txs[txHash]
+        if tx[3] is None:
+            [bhBinary, count, gas, _] = tx
+            links = prevHashOf(bhBinary[:80]) == hashHeader(self.corpus.header(self.height))
+            if txHash in self.failNonces or not links:
+                tx[3] = gas
+            else:
+                self.height += count
+                tx[3] = 100000 * count
+        return {'gasUsed': hex(tx[3])}
+
+
+class TestRelayDaemon(object):
+
+    TEXT = "test/headers/500from300k.txt"
+
+    def setup_class(cls):
+        cls.tmpDir = tempfile.mkdtemp()
+        cls.path = cls.tmpDir + '/500from300k.bhc'
+        convertText([cls.TEXT], cls.path)
+        cls.corpus = HeaderCorpus(cls.path)
+
+    def teardown_class(cls):
+        cls.corpus.close()
+        shutil.rmtree(cls.tmpDir)
+
+    def makeDaemon(self, source, node, reconciles, **kwargs):
+        def reconcile():
+            reconciles.append(node.height)
+            return False
+        return RelayDaemon(source, node, lambda: node.height, reconcile,
+            pollInterval=0.01, receiptInterval=0.01, **kwargs)
+
+    def waitFor(self, condition, timeout=10):
+        endTime = time() + timeout
+        while not condition() and time() < endTime:
+            sleep(0.01)
+        return condition()
+
+    def testFollowsTip(self):
+        source = FakeSource(self.corpus, 300022)
+        node = FakeNode(self.corpus, 300000, maxInFlight=3)
+        daemon = self.makeDaemon(source, node, [], chunkSize=5)
+        daemon.start()
+        try:
+            assert self.waitFor(lambda: node.height == 300022)
+
+            # a new block is relayed on its own, without waiting for a chunk
+            source.tip = 300023
+            startTime = time()
+            assert self.waitFor(lambda: node.height == 300023)
+            assert time() - startTime < 2
+        finally:
+            daemon.stop()
+
+        assert [tx[1] for tx in node.txs] == [5, 5, 5, 5, 2, 1]
+        assert ''.join(tx[0] for tx in node.txs) == str(self.corpus.headers(300001, 300023))
+
+    def testSlowNodeDoesNotStallFetch(self):
+        source = FakeSource(self.corpus, 300100)
+        node = FakeNode(self.corpus, 300000, maxInFlight=2)
+        node.mining.clear()
+        daemon = self.makeDaemon(source, node, [], chunkSize=5, queueSize=3)
+        daemon.start()
+        try:
+            # 2 chunks are sent and the fetcher keeps going until the queue
+            # is full, while the tip is still followed
+            assert self.waitFor(lambda: len(node.txs) == 2 and daemon.submitQueue.full())
+            assert source.numFetched > 2 * 5
+            source.tip = 300200
+            assert self.waitFor(lambda: daemon.tipHeight == 300200)
+
+            node.mining.set()
+            assert self.waitFor(lambda: node.height == 300200)
+        finally:
+            daemon.stop()
+
+    def testFailedChunkRestartsFromHead(self):
+        source = FakeSource(self.corpus, 300040)
+        node = FakeNode(self.corpus, 300000, failNonces=[2], maxInFlight=4)
+        reconciles = []
+        daemon = self.makeDaemon(source, node, reconciles, chunkSize=5)
+        daemon.start()
+        try:
+            assert self.waitFor(lambda: node.height == 300040)
+        finally:
+            daemon.stop()
+
+        # once at start, then after the chunk with nonce 2 failed
+        assert reconciles[0] == 300000
+        assert 300010 in reconciles[1:]
+        stored = [tx[0] for tx in node.txs if tx[3] < tx[2]]
+        assert ''.join(stored) == str(self.corpus.headers(300001, 300040))
+
+    # reconcile exits (as fetchd.reconcileHead does for a reorg that is too
+    # deep) once a chunk fails: the whole daemon stops, not only its thread
+    def testExitStopsDaemon(self):
+        source = FakeSource(self.corpus, 300040)
+        node = FakeNode(self.corpus, 300000, failNonces=[2], maxInFlight=4)
+
+        def reconcile():
+            if node.txs:
+                sys.exit()
+            return False
+        daemon = RelayDaemon(source, node, lambda: node.height, reconcile,
+            chunkSize=5, pollInterval=0.01, receiptInterval=0.01)
+        daemon.start()
+        try:
+            with pytest.raises(SystemExit):
+                daemon.wait(interval=0.01)
+        finally:
+            daemon.stop()
+
+        assert not any(t.is_alive() for t in daemon.threads)
+        assert node.height < 300040
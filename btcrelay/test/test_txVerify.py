@@ -2,7 +2,7 @@ from ethereum import tester
 from datetime import datetime, date
 from functools import partial
 
-from utilRelay import makeMerkleProof, randomMerkleProof
+from utilRelay import makeMerkleProof, randomMerkleProof, BLOCK_GAS_LIMIT
 
 import time
 
@@ -19,7 +19,7 @@ class TestTxVerify(object):
     ETHER = 10 ** 18
 
     def setup_class(cls):
-        tester.gas_limit = int(2.25e6)
+        tester.gas_limit = BLOCK_GAS_LIMIT
         cls.s = tester.state()
         cls.c = cls.s.abi_contract(cls.CONTRACT, endowment=2000*cls.ETHER)
         cls.snapshot = cls.s.snapshot()
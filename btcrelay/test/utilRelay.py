@@ -3,46 +3,61 @@ from functools import partial
 
 from bitcoin import *
 
+import sys
+sys.path.append('script')
+from merkleTree import MerkleTree
+
 #
 # helper functions for relayTx testing
 #
 
-def makeMerkleProof(header, hashes, txIndex):
-    proof = mk_merkle_proof(header, hashes, txIndex)  # from pybitcointools
+# gas limit of the tester's blocks when creating the relay contracts, which
+# need more than the tester's default of 1M
+BLOCK_GAS_LIMIT = 3141592
 
-    txHash = int(proof['hash'], 16)
-    siblings = map(partial(int,base=16), proof['siblings'])
-    txBlockHash = int(proof['header']['hash'], 16)
 
-    return [txHash, txIndex, siblings, txBlockHash]
+def makeMerkleProof(header, hashes, txIndex):
+    tree = makeMerkleTree(header, hashes)
+    return tree.proof(txIndex)
 
 
-def randomMerkleProof(blocknum, txIndex=-1, withMerkle=False):
-    header = get_block_header_data(blocknum)
-    hashes = get_txs_in_block(blocknum)
+def makeMerkleTree(header, hashes):
+    tree = MerkleTree.fromHexHashes(hashes, int(header['hash'], 16))
+    # sanity check, like pybitcointools' mk_merkle_proof
+    assert tree.root() == int(header['merkle_root'], 16)
+    return tree
 
-    numTx = len(hashes)
-    if numTx == 0:
-        print('@@@@ empty blocknum='+str(blocknum))
-        return
 
-    index = random.randrange(numTx) if txIndex == -1 else txIndex
+# trees of the blocks that randomMerkleProof has fetched, by blocknum
+blockTrees = {}
 
-    print('txStr='+hashes[index])
+def randomMerkleProof(blocknum, txIndex=-1, withMerkle=False):
+    if blocknum not in blockTrees:
+        header = get_block_header_data(blocknum)
+        hashes = get_txs_in_block(blocknum)
+        if len(hashes) == 0:
+            print('@@@@ empty blocknum='+str(blocknum))
+            return
+        blockTrees[blocknum] = makeMerkleTree(header, hashes)
 
-    proof = mk_merkle_proof(header, hashes, index)
+    tree = blockTrees[blocknum]
+    index = random.randrange(tree.numTx) if txIndex == -1 else txIndex
 
-    print('@@@@@@@@@@@@@@@@ blocknum='+str(blocknum)+'\ttxIndex='+str(index))
+    print('txStr='+format(tree.txHash(index), '064x'))
 
-    txHash = int(hashes[index], 16)
-    siblings = map(partial(int,base=16), proof['siblings'])
-    txBlockHash = int(header['hash'], 16)
+    print('@@@@@@@@@@@@@@@@ blocknum='+str(blocknum)+'\ttxIndex='+str(index))
 
-    ret = [txHash, index, siblings, txBlockHash]  # note: just 'index' here
+    ret = tree.proof(index)  # note: just 'index' here
     if withMerkle:
-        ret.append(int(proof['header']['merkle_root'], 16))
+        ret.append(tree.root())
     return ret
 
 
 def dblSha256Flip(rawBytes):
     return int(bin_sha256(bin_sha256(rawBytes))[::-1].encode('hex'), 16)
+
+
+# gas of a transaction's 'data', which profiling leaves out
+def calldataGas(data):
+    zeroBytes = data.count(chr(0))
+    return 4*zeroBytes + 68*(len(data) - zeroBytes)  # GTXDATAZERO, GTXDATANONZERO